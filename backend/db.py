@@ -1,6 +1,21 @@
 import sqlite3
+import atexit
+import functools
+import heapq
+import itertools
+import json
+import logging
+import operator
 import os
-from datetime import datetime
+import pathlib
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import numpy as np
+
+log = logging.getLogger(__name__)
 
 # fmt: off
 NASDAQ_100_SYMBOLS = [
@@ -20,158 +35,497 @@ NASDAQ_100_SYMBOLS = [
 ]
 # fmt: on
 
+# Bumped whenever _initialize_db gains a migration for existing files.
+# 1: stock_cache columns and layout; 2: _PAGE_SIZE pages (_rebuild_pages).
+_SCHEMA_VERSION = 2
+
+# Larger pages mean fewer B-tree pages per history scan.
+_PAGE_SIZE = 32768
+
+# Seconds between PRAGMA optimize runs triggered from the write path.
+_OPTIMIZE_INTERVAL = 15 * 60
+
+# Prepared statements kept per connection (sqlite3 default: 128).
+_STATEMENT_CACHE_SIZE = 256
+
+# Per-connection settings; must be re-issued on every new connection.
+_CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-65536",
+    # Off by default in SQLite; needed for portfolio_symbols' ON DELETE CASCADE.
+    "PRAGMA foreign_keys=ON",
+    # Wait for a competing writer (another process or the WAL checkpoint)
+    # instead of failing with "database is locked".
+    "PRAGMA busy_timeout=5000",
+)
+
+
+# UPSERTs update the existing row in place; INSERT OR REPLACE would delete it
+# (and its index entries) and insert a fresh one.
+_UPSERT_STOCK_CACHE = """
+    INSERT INTO stock_cache
+        (symbol, name, price, open, high, low, close, volume, change_percent, last_fetched, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(symbol) DO UPDATE SET
+        name = excluded.name,
+        price = excluded.price,
+        open = excluded.open,
+        high = excluded.high,
+        low = excluded.low,
+        close = excluded.close,
+        volume = excluded.volume,
+        change_percent = excluded.change_percent,
+        last_fetched = excluded.last_fetched,
+        timestamp = excluded.timestamp
+"""
+
+_UPSERT_STOCK_HISTORY = """
+    INSERT INTO stock_history (symbol, date, open, high, low, close, volume, fetched_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(symbol, date) DO UPDATE SET
+        open = excluded.open,
+        high = excluded.high,
+        low = excluded.low,
+        close = excluded.close,
+        volume = excluded.volume,
+        fetched_at = excluded.fetched_at
+"""
+
+_UPSERT_SETTING = """
+    INSERT INTO app_settings (key, value, updated_at) VALUES (?, ?, ?)
+    ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+"""
+
+_UPSERT_FUNDAMENTALS = """
+    INSERT INTO fundamentals_cache (symbol, payload, fetched_at) VALUES (?, ?, ?)
+    ON CONFLICT(symbol) DO UPDATE SET payload = excluded.payload, fetched_at = excluded.fetched_at
+"""
+
+_UPSERT_FINANCIALS = """
+    INSERT INTO financial_statements
+        (symbol, end_date, ann_date, total_revenue, revenue, total_profit,
+         n_income, n_income_attr_p, operate_profit, total_cogs, oper_cost,
+         income_tax, basic_eps, diluted_eps, fetched_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(symbol, end_date) DO UPDATE SET
+        ann_date = excluded.ann_date,
+        total_revenue = excluded.total_revenue,
+        revenue = excluded.revenue,
+        total_profit = excluded.total_profit,
+        n_income = excluded.n_income,
+        n_income_attr_p = excluded.n_income_attr_p,
+        operate_profit = excluded.operate_profit,
+        total_cogs = excluded.total_cogs,
+        oper_cost = excluded.oper_cost,
+        income_tax = excluded.income_tax,
+        basic_eps = excluded.basic_eps,
+        diluted_eps = excluded.diluted_eps,
+        fetched_at = excluded.fetched_at
+"""
+
+# Hot read queries. sqlite3 keeps prepared statements in a per-connection
+# cache keyed by the SQL text, so every caller shares one string.
+_STOCK_COLUMNS = """
+    symbol, name, price, open, high, low, close, volume,
+    change_percent, last_fetched, timestamp
+"""
+
+_SELECT_STOCK = f"SELECT {_STOCK_COLUMNS} FROM stock_cache WHERE symbol = ?"
+
+_SELECT_ALL_STOCKS = f"SELECT {_STOCK_COLUMNS} FROM stock_cache ORDER BY symbol ASC"
+
+# The symbol list is bound as one JSON array, so a single prepared statement
+# serves any list length (and never approaches SQLITE_MAX_VARIABLE_NUMBER).
+_SELECT_STOCKS_IN = f"""
+    SELECT {_STOCK_COLUMNS} FROM stock_cache
+    WHERE symbol IN (SELECT value FROM json_each(?))
+    ORDER BY symbol ASC
+"""
+
+_SELECT_HISTORY = """
+    SELECT date, open, high, low, close, volume
+    FROM stock_history WHERE symbol = ? ORDER BY date ASC
+"""
+
+# History serialized by SQLite's json1 functions in one TEXT value; the
+# subquery fixes the element order. The date bounds are a range seek on
+# idx_history_full, so only the requested years are read.
+_SELECT_HISTORY_JSON = """
+    SELECT json_group_array(json_object(
+        'date', date, 'open', open, 'high', high, 'low', low, 'close', close, 'volume', volume
+    ))
+    FROM (
+        SELECT date, open, high, low, close, volume
+        FROM stock_history
+        WHERE symbol = ? AND date BETWEEN ? AND ?
+        ORDER BY date ASC
+    )
+"""
+
+_SELECT_HISTORY_RANGE = """
+    SELECT date, open, high, low, close, volume
+    FROM stock_history
+    WHERE symbol = ? AND date BETWEEN ? AND ?
+    ORDER BY date ASC
+"""
+
+# Several symbols' ranges in one statement (symbols bound as a JSON array, as
+# in _SELECT_STOCKS_IN); each is an index range seek, rows grouped by symbol.
+_SELECT_HISTORIES_RANGE = """
+    SELECT symbol, date, open, high, low, close, volume
+    FROM stock_history
+    WHERE symbol IN (SELECT value FROM json_each(?)) AND date BETWEEN ? AND ?
+    ORDER BY symbol, date ASC
+"""
+
+_SELECT_HISTORY_BOUNDS = "SELECT MIN(date), MAX(date) FROM stock_history WHERE symbol = ?"
+
+_HISTORY_COLUMNS = ("date", "open", "high", "low", "close", "volume")
+
+# One row per symbol, clustered on the symbol key (no hidden rowid B-tree).
+_STOCK_CACHE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        symbol TEXT PRIMARY KEY,
+        name TEXT,
+        price REAL,
+        open REAL,
+        high REAL,
+        low REAL,
+        close REAL,
+        volume INTEGER,
+        change_percent REAL DEFAULT 0.0,
+        last_fetched DATETIME,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    ) WITHOUT ROWID
+"""
+
+
+def _float_or_none(value):
+    """float(value), passing None (a missing price) through."""
+    return None if value is None else float(value)
+
+
+def _fetch_dicts(cursor):
+    """Fetch the remaining rows of cursor as dicts keyed by column name.
+
+    The column names are read from cursor.description once per query rather
+    than per row, as dict(sqlite3.Row) does.
+    """
+    columns = [d[0] for d in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
 
 class StockDatabase:
     def __init__(self, db_path=None):
         if db_path is None:
             db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gravion.db")
         self.db_path = db_path
+        # One long-lived writer connection shared by all write methods. It runs
+        # in autocommit mode; multi-statement writes go through _transaction().
+        # Reads use per-thread read-only connections (see _reader), which WAL
+        # lets proceed without blocking on the writer.
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._conn = self._connect()
+        # Symbols present in stock_cache, kept in step with every write so
+        # get_db_info can report the count without a COUNT(*) scan.
+        self._symbols = set()
+        # app_settings mirrored in memory. Every write goes through
+        # set_setting, so the copy never goes stale and the per-request
+        # data_source/date-range lookups skip the database entirely.
+        self._settings = {}
+        self._last_optimize = time.monotonic()
         self._initialize_db()
+        atexit.register(self._optimize)
+
+    def _connect(self, read_only=False):
+        """Open a connection with the per-connection PRAGMAs applied."""
+        if read_only:
+            uri = pathlib.Path(os.path.abspath(self.db_path)).as_uri() + "?mode=ro"
+            conn = sqlite3.connect(
+                uri, uri=True, check_same_thread=False, isolation_level=None, cached_statements=_STATEMENT_CACHE_SIZE
+            )
+        else:
+            conn = sqlite3.connect(
+                self.db_path, check_same_thread=False, isolation_level=None, cached_statements=_STATEMENT_CACHE_SIZE
+            )
+        for pragma in _CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _reader(self):
+        """Return the calling thread's read-only connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect(read_only=True)
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Run PRAGMA optimize, then close the writer and the calling thread's reader.
+
+        Readers opened by other threads are closed when those threads exit and
+        their thread-local storage is released.
+        """
+        self._optimize()
+        atexit.unregister(self._optimize)
+        with self._lock:
+            reader = getattr(self._local, "conn", None)
+            if reader is not None:
+                reader.close()
+                self._local.conn = None
+            self._conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        """Hold the connection lock and run the enclosed writes as a single transaction."""
+        with self._lock:
+            cursor = self._conn.cursor()
+            # IMMEDIATE takes the write lock up front, where busy_timeout
+            # applies; a deferred read->write upgrade fails with SQLITE_BUSY.
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                yield cursor
+                cursor.execute("COMMIT")
+            except BaseException:
+                # Also covers a failed COMMIT (busy, disk full, I/O error),
+                # which would otherwise leave the shared writer inside an
+                # open transaction. SQLite may already have rolled back.
+                if self._conn.in_transaction:
+                    cursor.execute("ROLLBACK")
+                raise
+            # Long-running servers rarely reach atexit; refresh planner stats
+            # from the write path, where they drift.
+            if time.monotonic() - self._last_optimize >= _OPTIMIZE_INTERVAL:
+                self._optimize()
 
     def _initialize_db(self):
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS stock_cache (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    symbol TEXT UNIQUE,
-                    name TEXT,
-                    price REAL,
-                    open REAL,
-                    high REAL,
-                    low REAL,
-                    close REAL,
-                    volume INTEGER,
-                    change_percent REAL DEFAULT 0.0,
-                    last_fetched DATETIME,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            # Migration: add columns if upgrading from Phase 1 schema
-            for col, col_type in [
-                ("open", "REAL"),
-                ("high", "REAL"),
-                ("low", "REAL"),
-                ("close", "REAL"),
-                ("last_fetched", "DATETIME"),
-            ]:
-                try:
-                    cursor.execute(f"ALTER TABLE stock_cache ADD COLUMN {col} {col_type}")
-                except sqlite3.OperationalError:
-                    pass  # column already exists
-
-            # Phase 3: Historical OHLC data for charting
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS stock_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    symbol TEXT NOT NULL,
-                    date TEXT NOT NULL,
-                    open REAL,
-                    high REAL,
-                    low REAL,
-                    close REAL,
-                    volume INTEGER,
-                    fetched_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(symbol, date)
-                )
-            """)
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_history_symbol_date
-                ON stock_history(symbol, date)
-            """)
+            cursor = self._conn.cursor()
+            # Persistent settings, stored in the database file. page_size and
+            # auto_vacuum only take effect on a fresh file, so they must precede
+            # the first CREATE.
+            cursor.execute(f"PRAGMA page_size={_PAGE_SIZE}")
+            cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            # Files from before version 2 get one rewrite into the larger
+            # pages; the transaction below then records the new version, so
+            # this is attempted once and never on later starts.
+            cursor.execute("PRAGMA user_version")
+            if cursor.fetchone()[0] < 2:
+                cursor.execute("PRAGMA page_size")
+                if cursor.fetchone()[0] < _PAGE_SIZE:
+                    self._rebuild_pages(cursor)
+            cursor.execute("PRAGMA journal_mode=WAL")
+            # Schema, migrations and seed data commit as one transaction.
+            with self._transaction() as cursor:
+                cursor.execute(_STOCK_CACHE_SCHEMA.format(table="stock_cache"))
 
-            # Phase 7: Financial statements cache (quarterly income data)
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS financial_statements (
-                    id              INTEGER PRIMARY KEY AUTOINCREMENT,
-                    symbol          TEXT NOT NULL,
-                    end_date        TEXT NOT NULL,
-                    ann_date        TEXT,
-                    total_revenue   REAL,
-                    revenue         REAL,
-                    total_profit    REAL,
-                    n_income        REAL,
-                    n_income_attr_p REAL,
-                    operate_profit  REAL,
-                    total_cogs      REAL,
-                    oper_cost       REAL,
-                    income_tax      REAL,
-                    basic_eps       REAL,
-                    diluted_eps     REAL,
-                    fetched_at      DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(symbol, end_date)
-                )
-            """)
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_fs_symbol_date
-                ON financial_statements(symbol, end_date)
-            """)
+                # Phase 3: Historical OHLC data for charting
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS stock_history (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        symbol TEXT NOT NULL,
+                        date TEXT NOT NULL,
+                        open REAL,
+                        high REAL,
+                        low REAL,
+                        close REAL,
+                        volume INTEGER,
+                        fetched_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        UNIQUE(symbol, date)
+                    )
+                """)
+                # Covering index: history reads are answered from the index alone
+                # without a lookup into the table B-tree per row.
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_history_full
+                    ON stock_history(symbol, date, open, high, low, close, volume)
+                """)
 
-            # Phase 5: App settings
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS app_settings (
-                    key TEXT PRIMARY KEY,
-                    value TEXT NOT NULL,
-                    updated_at DATETIME
-                )
-            """)
+                # Phase 7: Financial statements cache (quarterly income data)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS financial_statements (
+                        id              INTEGER PRIMARY KEY AUTOINCREMENT,
+                        symbol          TEXT NOT NULL,
+                        end_date        TEXT NOT NULL,
+                        ann_date        TEXT,
+                        total_revenue   REAL,
+                        revenue         REAL,
+                        total_profit    REAL,
+                        n_income        REAL,
+                        n_income_attr_p REAL,
+                        operate_profit  REAL,
+                        total_cogs      REAL,
+                        oper_cost       REAL,
+                        income_tax      REAL,
+                        basic_eps       REAL,
+                        diluted_eps     REAL,
+                        fetched_at      DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        UNIQUE(symbol, end_date)
+                    )
+                """)
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_fs_symbol_date
+                    ON financial_statements(symbol, end_date)
+                """)
+                # Freshness checks seek on fetched_at per symbol
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_fs_symbol_fetched
+                    ON financial_statements(symbol, fetched_at)
+                """)
 
-            # Phase 5: Portfolios
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS portfolios (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT UNIQUE NOT NULL,
-                    is_system INTEGER DEFAULT 0,
-                    created_at DATETIME
-                )
-            """)
+                # yfinance Ticker.info snapshot (selected keys as JSON), TTL-checked on read
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS fundamentals_cache (
+                        symbol     TEXT PRIMARY KEY,
+                        payload    TEXT NOT NULL,
+                        fetched_at DATETIME NOT NULL
+                    ) WITHOUT ROWID
+                """)
 
-            # Phase 5: Portfolio symbols
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS portfolio_symbols (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    portfolio_id INTEGER NOT NULL,
-                    symbol TEXT NOT NULL,
-                    UNIQUE(portfolio_id, symbol),
-                    FOREIGN KEY (portfolio_id) REFERENCES portfolios(id) ON DELETE CASCADE
-                )
-            """)
+                # Phase 5: App settings
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS app_settings (
+                        key TEXT PRIMARY KEY,
+                        value TEXT NOT NULL,
+                        updated_at DATETIME
+                    )
+                """)
 
-            conn.commit()
+                # Phase 5: Portfolios
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS portfolios (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        name TEXT UNIQUE NOT NULL,
+                        is_system INTEGER DEFAULT 0,
+                        created_at DATETIME
+                    )
+                """)
 
-            # Seed default settings (idempotent)
-            for key, value in [
-                ("data_source", "yahoo_finance"),
-                ("global_start_date", ""),
-                ("global_end_date", ""),
-                ("binance_api_key", ""),
-                ("binance_api_secret", ""),
-            ]:
-                cursor.execute(
-                    "INSERT OR IGNORE INTO app_settings (key, value, updated_at) VALUES (?, ?, ?)",
-                    (key, value, datetime.now().isoformat()),
-                )
+                # Phase 5: Portfolio symbols
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS portfolio_symbols (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        portfolio_id INTEGER NOT NULL,
+                        symbol TEXT NOT NULL,
+                        UNIQUE(portfolio_id, symbol),
+                        FOREIGN KEY (portfolio_id) REFERENCES portfolios(id) ON DELETE CASCADE
+                    )
+                """)
 
-            # Seed NASDAQ 100 system portfolio (idempotent)
-            cursor.execute("SELECT id FROM portfolios WHERE name = 'NASDAQ 100'")
-            row = cursor.fetchone()
-            if row is None:
-                cursor.execute(
-                    "INSERT INTO portfolios (name, is_system, created_at) VALUES (?, 1, ?)",
-                    ("NASDAQ 100", datetime.now().isoformat()),
-                )
-                portfolio_id = cursor.lastrowid
-                cursor.executemany(
-                    "INSERT OR IGNORE INTO portfolio_symbols (portfolio_id, symbol) VALUES (?, ?)",
-                    [(portfolio_id, sym) for sym in NASDAQ_100_SYMBOLS],
-                )
+                # Migrations for files created by older versions. user_version
+                # records that they ran, so later starts skip them entirely.
+                cursor.execute("PRAGMA user_version")
+                if cursor.fetchone()[0] < _SCHEMA_VERSION:
+                    cursor.execute("PRAGMA table_info(stock_cache)")
+                    existing = {r[1] for r in cursor.fetchall()}
+                    # Add columns if upgrading from Phase 1 schema
+                    for col, col_type in [
+                        ("open", "REAL"),
+                        ("high", "REAL"),
+                        ("low", "REAL"),
+                        ("close", "REAL"),
+                        ("last_fetched", "DATETIME"),
+                    ]:
+                        if col not in existing:
+                            cursor.execute(f"ALTER TABLE stock_cache ADD COLUMN {col} {col_type}")
+                    # Rebuild the pre-WITHOUT ROWID table (id + UNIQUE symbol)
+                    if "id" in existing:
+                        self._rebuild_stock_cache(cursor)
+                    # Superseded by idx_history_full
+                    cursor.execute("DROP INDEX IF EXISTS idx_history_symbol_date")
+                    cursor.execute(f"PRAGMA user_version={_SCHEMA_VERSION}")
 
-            conn.commit()
-            conn.close()
-            print(f"Database initialized at {self.db_path}")
-        except Exception as e:
-            print(f"Error initializing database: {e}")
+                # Seed default settings (idempotent)
+                now = datetime.now().isoformat()
+                for key, value in [
+                    ("data_source", "yahoo_finance"),
+                    ("global_start_date", ""),
+                    ("global_end_date", ""),
+                    ("binance_api_key", ""),
+                    ("binance_api_secret", ""),
+                ]:
+                    cursor.execute(
+                        "INSERT OR IGNORE INTO app_settings (key, value, updated_at) VALUES (?, ?, ?)",
+                        (key, value, now),
+                    )
+
+                # Seed NASDAQ 100 system portfolio (idempotent)
+                cursor.execute("SELECT id FROM portfolios WHERE name = 'NASDAQ 100'")
+                row = cursor.fetchone()
+                if row is None:
+                    cursor.execute(
+                        "INSERT INTO portfolios (name, is_system, created_at) VALUES (?, 1, ?)",
+                        ("NASDAQ 100", now),
+                    )
+                    portfolio_id = cursor.lastrowid
+                    cursor.executemany(
+                        "INSERT OR IGNORE INTO portfolio_symbols (portfolio_id, symbol) VALUES (?, ?)",
+                        [(portfolio_id, sym) for sym in NASDAQ_100_SYMBOLS],
+                    )
+
+            # Give the planner initial statistics; afterwards PRAGMA optimize
+            # (see _optimize) refreshes them only when they go stale.
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                cursor.execute("ANALYZE")
+            else:
+                self._optimize()
+
+            cursor.execute("SELECT symbol FROM stock_cache")
+            self._symbols = {row[0] for row in cursor.fetchall()}
+            cursor.execute("SELECT key, value FROM app_settings")
+            self._settings = dict(cursor.fetchall())
+
+            log.info("Database initialized at %s", self.db_path)
+        except Exception:
+            log.exception("Error initializing database")
+
+    def _optimize(self):
+        """Run PRAGMA optimize on the writer connection.
+
+        Called at startup, at most every _OPTIMIZE_INTERVAL seconds after a
+        write transaction, and on close/exit.
+        """
+        try:
+            with self._lock:
+                self._last_optimize = time.monotonic()
+                self._conn.execute("PRAGMA optimize")
+        except sqlite3.Error as e:
+            log.warning("PRAGMA optimize failed: %s", e)
+
+    def _rebuild_pages(self, cursor):
+        """Version 2 migration: VACUUM an existing file into _PAGE_SIZE pages.
+
+        Blocks for as long as the VACUUM takes (it rewrites the whole file),
+        hence the log lines. The page size of a WAL database is fixed, so this
+        briefly switches back to a rollback journal; the caller re-enables WAL
+        afterwards.
+        """
+        log.info("Migrating %s to %d-byte pages (one-time VACUUM)...", self.db_path, _PAGE_SIZE)
+        started = time.monotonic()
+        try:
+            cursor.execute("PRAGMA journal_mode=DELETE")
+            cursor.execute(f"PRAGMA page_size={_PAGE_SIZE}")
+            cursor.execute("VACUUM")
+        except sqlite3.OperationalError as e:
+            log.warning("Skipping page size migration: %s", e)
+            return
+        log.info("Page size migration finished in %.1fs", time.monotonic() - started)
+
+    def _rebuild_stock_cache(self, cursor):
+        """Copy stock_cache into the WITHOUT ROWID layout keyed on symbol (inside the caller's transaction)."""
+        columns = "symbol, name, price, open, high, low, close, volume, change_percent, last_fetched, timestamp"
+        cursor.execute("DROP TABLE IF EXISTS stock_cache_new")
+        cursor.execute(_STOCK_CACHE_SCHEMA.format(table="stock_cache_new"))
+        cursor.execute(
+            f"INSERT OR REPLACE INTO stock_cache_new ({columns}) "
+            f"SELECT {columns} FROM stock_cache WHERE symbol IS NOT NULL ORDER BY id"
+        )
+        cursor.execute("DROP TABLE stock_cache")
+        cursor.execute("ALTER TABLE stock_cache_new RENAME TO stock_cache")
 
     def save_stock_data(
         self,
@@ -186,298 +540,342 @@ class StockDatabase:
         close_price=None,
         last_fetched=None,
     ):
+        """Upsert one stock_cache row; a single-item save_stock_data_many."""
+        return bool(self.save_stock_data_many([dict(
+            symbol=symbol,
+            name=name,
+            price=price,
+            volume=volume,
+            change_percent=change_percent,
+            open_price=open_price,
+            high_price=high_price,
+            low_price=low_price,
+            close_price=close_price,
+            last_fetched=last_fetched,
+        )]))
+
+    def save_stock_data_many(self, items):
+        """Upsert many stock_cache rows in one transaction. items = iterable of dicts keyed like save_stock_data's arguments.
+        Returns the number of rows written, or 0 if the batch failed."""
+        items = list(items)
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
             now = datetime.now().isoformat()
-            cursor.execute(
-                """
-                INSERT OR REPLACE INTO stock_cache
-                    (symbol, name, price, open, high, low, close, volume, change_percent, last_fetched, timestamp)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-                (
-                    symbol,
-                    name,
-                    price,
-                    open_price,
-                    high_price,
-                    low_price,
-                    close_price,
-                    volume,
-                    change_percent,
-                    last_fetched or now,
-                    now,
-                ),
-            )
-            conn.commit()
-            conn.close()
-            return True
-        except Exception as e:
-            print(f"Error saving stock data for {symbol}: {e}")
-            return False
+            with self._transaction() as cursor:
+                cursor.executemany(
+                    _UPSERT_STOCK_CACHE,
+                    (
+                        (
+                            item["symbol"],
+                            item["name"],
+                            item["price"],
+                            item.get("open_price"),
+                            item.get("high_price"),
+                            item.get("low_price"),
+                            item.get("close_price"),
+                            item["volume"],
+                            item.get("change_percent", 0.0),
+                            item.get("last_fetched") or now,
+                            now,
+                        )
+                        for item in items
+                    ),
+                )
+            self._symbols.update(item["symbol"] for item in items)
+            return len(items)
+        except Exception:
+            log.exception("Error saving stock data for %s", ", ".join(item.get("symbol", "?") for item in items))
+            return 0
 
     def get_stock_data(self, symbol):
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                SELECT symbol, name, price, open, high, low, close, volume,
-                       change_percent, last_fetched, timestamp
-                FROM stock_cache WHERE symbol = ?
-                ORDER BY timestamp DESC LIMIT 1
-            """,
-                (symbol,),
-            )
-            row = cursor.fetchone()
-            conn.close()
-            return dict(row) if row else None
-        except Exception as e:
-            print(f"Error retrieving stock data: {e}")
+            cursor = self._reader().cursor()
+            cursor.execute(_SELECT_STOCK, (symbol,))
+            rows = _fetch_dicts(cursor)
+            return rows[0] if rows else None
+        except Exception:
+            log.exception("Error retrieving stock data")
             return None
 
     def get_all_stocks(self):
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT symbol, name, price, open, high, low, close, volume,
-                       change_percent, last_fetched, timestamp
-                FROM stock_cache ORDER BY symbol ASC
-            """)
-            rows = cursor.fetchall()
-            conn.close()
-            return [dict(row) for row in rows]
-        except Exception as e:
-            print(f"Error retrieving all stocks: {e}")
+            cursor = self._reader().cursor()
+            cursor.execute(_SELECT_ALL_STOCKS)
+            return _fetch_dicts(cursor)
+        except Exception:
+            log.exception("Error retrieving all stocks")
             return []
 
+    def iter_stocks(self, batch_size=500):
+        """Yield stock_cache rows as dicts, fetched from the cursor in batches.
+
+        Runs on its own read-only connection, closed when the generator is
+        exhausted or discarded, so a consumer that advances it from different
+        threads (a streamed response) never shares the per-thread reader.
+        """
+        conn = self._connect(read_only=True)
+        try:
+            cursor = conn.execute(_SELECT_ALL_STOCKS)
+            columns = [d[0] for d in cursor.description]
+            while rows := cursor.fetchmany(batch_size):
+                for row in rows:
+                    yield dict(zip(columns, row))
+        finally:
+            conn.close()
+
     def get_db_info(self):
         try:
             size_bytes = os.path.getsize(self.db_path) if os.path.exists(self.db_path) else 0
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM stock_cache")
-            count = cursor.fetchone()[0]
-            conn.close()
             return {
                 "path": os.path.basename(self.db_path),
                 "size_bytes": size_bytes,
-                "stock_count": count,
+                "stock_count": len(self._symbols),
             }
-        except Exception as e:
-            print(f"Error getting db info: {e}")
+        except Exception:
+            log.exception("Error getting db info")
             return {"path": "gravion.db", "size_bytes": 0, "stock_count": 0}
 
     def save_stock_history(self, symbol, rows):
         """Batch insert historical OHLC data. rows = list of dicts with date, open, high, low, close, volume."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.executemany(
-                """
-                INSERT OR REPLACE INTO stock_history (symbol, date, open, high, low, close, volume, fetched_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                [
-                    (symbol, r["date"], r["open"], r["high"], r["low"], r["close"], r["volume"], datetime.now().isoformat())
-                    for r in rows
-                ],
-            )
-            
-            # Also update stock_cache with the latest data point
-            if rows:
-                # Sort by date to get the latest
-                sorted_rows = sorted(rows, key=lambda x: x["date"], reverse=True)
-                latest = sorted_rows[0]
-                fetch_time = datetime.now().isoformat()
-                
-                # Calculate change percent if we have at least two data points
-                change_percent = 0.0
-                if len(sorted_rows) >= 2:
-                    latest_close = float(latest["close"])
-                    prev_close = float(sorted_rows[1]["close"])
-                    if prev_close > 0:
-                        change_percent = round(((latest_close - prev_close) / prev_close) * 100, 2)
-                
-                # Update or insert into stock_cache
-                cursor.execute(
-                    """
-                    INSERT OR REPLACE INTO stock_cache
-                        (symbol, name, price, open, high, low, close, volume, change_percent, last_fetched, timestamp)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """,
-                    (
-                        symbol,
-                        symbol,  # name will be updated by price fetch
-                        float(latest["close"]),
-                        float(latest["open"]),
-                        float(latest["high"]),
-                        float(latest["low"]),
-                        float(latest["close"]),
-                        int(latest["volume"]),
-                        change_percent,
-                        fetch_time,
-                        fetch_time,
-                    ),
-                )
-            
-            conn.commit()
-            conn.close()
-            return len(rows)
-        except Exception as e:
-            print(f"Error saving stock history for {symbol}: {e}")
+            fetch_time = datetime.now().isoformat()
+            cached = set()
+            with self._transaction() as cursor:
+                written = self._write_history(cursor, symbol, rows, fetch_time, cached)
+            self._symbols |= cached
+            return written
+        except Exception:
+            log.exception("Error saving stock history for %s", symbol)
             return 0
 
-    def get_stock_history(self, symbol):
-        """Return historical OHLC data ordered by date ASC."""
+    def save_many_histories(self, batches):
+        """Insert history for several symbols in one transaction (one commit).
+
+        batches is an iterable of (symbol, rows) pairs, rows as accepted by
+        save_stock_history; pass dict.items() for a symbol -> rows mapping.
+        Each pair is written exactly as save_stock_history would write it.
+        Returns the total number of rows written, or 0 if the batch failed.
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
+            fetch_time = datetime.now().isoformat()
+            with self._transaction() as cursor:
+                total = 0
+                cached = set()
+                for symbol, rows in batches:
+                    total += self._write_history(cursor, symbol, rows, fetch_time, cached)
+            self._symbols |= cached
+            return total
+        except Exception:
+            log.exception("Error saving stock history batch")
+            return 0
+
+    def _write_history(self, cursor, symbol, rows, fetch_time, cached):
+        """Write one symbol's history rows inside an open transaction.
+        Adds symbol to the cached set when its stock_cache row was refreshed."""
+        cursor.executemany(
+            _UPSERT_STOCK_HISTORY,
+            (
+                (symbol, r["date"], r["open"], r["high"], r["low"], r["close"], r["volume"], fetch_time)
+                for r in rows
+            ),
+        )
+
+        # Also update stock_cache with the latest priced data point. Rows
+        # without a close (halted or partial days) are skipped, so one such
+        # bar cannot fail, and roll back, a multi-symbol batch.
+        # Only the two latest rows are needed; nlargest avoids sorting
+        # (and copying) a multi-year backfill just to read its head.
+        sorted_rows = heapq.nlargest(
+            2, (r for r in rows if r["close"] is not None), key=lambda x: x["date"]
+        )
+        if sorted_rows:
+            latest = sorted_rows[0]
+
+            # Calculate change percent if we have at least two data points
+            change_percent = 0.0
+            if len(sorted_rows) >= 2:
+                latest_close = float(latest["close"])
+                prev_close = float(sorted_rows[1]["close"])
+                if prev_close > 0:
+                    change_percent = round(((latest_close - prev_close) / prev_close) * 100, 2)
+
+            # Update or insert into stock_cache
             cursor.execute(
-                """
-                SELECT date, open, high, low, close, volume
-                FROM stock_history WHERE symbol = ? ORDER BY date ASC
-                """,
-                (symbol,),
+                _UPSERT_STOCK_CACHE,
+                (
+                    symbol,
+                    symbol,  # name will be updated by price fetch
+                    float(latest["close"]),
+                    _float_or_none(latest["open"]),
+                    _float_or_none(latest["high"]),
+                    _float_or_none(latest["low"]),
+                    float(latest["close"]),
+                    int(latest["volume"] or 0),
+                    change_percent,
+                    fetch_time,
+                    fetch_time,
+                ),
             )
-            rows = cursor.fetchall()
-            conn.close()
-            return [dict(row) for row in rows]
-        except Exception as e:
-            print(f"Error retrieving stock history for {symbol}: {e}")
+            cached.add(symbol)
+
+        return len(rows)
+
+    def get_stock_history(self, symbol):
+        """Return historical OHLC data ordered by date ASC."""
+        try:
+            cursor = self._reader().cursor()
+            cursor.execute(_SELECT_HISTORY, (symbol,))
+            return _fetch_dicts(cursor)
+        except Exception:
+            log.exception("Error retrieving stock history for %s", symbol)
             return []
 
     def get_history_freshness(self, symbol):
         """Return the most recent date and fetch timestamp for a symbol's history."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            cursor = self._reader().cursor()
             cursor.execute(
                 "SELECT MAX(date) as max_date, MAX(fetched_at) as last_fetch FROM stock_history WHERE symbol = ?",
                 (symbol,),
             )
             row = cursor.fetchone()
-            conn.close()
             if row and row[0]:
                 return {"max_date": row[0], "last_fetch": row[1]}
             return None
-        except Exception as e:
-            print(f"Error checking history freshness for {symbol}: {e}")
+        except Exception:
+            log.exception("Error checking history freshness for %s", symbol)
             return None
 
-    def get_stock_history_range(self, symbol, start_date, end_date):
-        """Return historical OHLC data filtered by date range, ordered by date ASC."""
+    def get_stock_history_columns(self, symbol, start_date=None, end_date=None):
+        """Return historical OHLC data ordered by date ASC as one column per key.
+
+        Same data as get_stock_history (or get_stock_history_range when both
+        dates are given) but without a dict per row; suited to callers that
+        build a DataFrame. "date" is a list of strings and the numeric columns
+        are float64 arrays (missing values become NaN).
+        Returns {} when there is no history.
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
+            cursor = self._reader().cursor()
+            if start_date and end_date:
+                cursor.execute(_SELECT_HISTORY_RANGE, (symbol, start_date, end_date))
+            else:
+                cursor.execute(_SELECT_HISTORY, (symbol,))
+            rows = cursor.fetchall()
+            if not rows:
+                return {}
+            dates, *numeric = zip(*rows)
+            columns = {"date": list(dates)}
+            for name, values in zip(_HISTORY_COLUMNS[1:], numeric):
+                columns[name] = np.array(values, dtype=np.float64)
+            return columns
+        except Exception:
+            log.exception("Error retrieving stock history for %s", symbol)
+            return {}
+
+    def get_histories_columns(self, symbols, start_date=None, end_date=None):
+        """Return {symbol: columns} for every symbol with history in the range.
+
+        Columns are laid out as in get_stock_history_columns; all symbols are
+        read with one query. Omitted dates leave that side of the range open.
+        Symbols without rows in the range are absent.
+        """
+        try:
+            cursor = self._reader().cursor()
             cursor.execute(
-                """
-                SELECT date, open, high, low, close, volume
-                FROM stock_history
-                WHERE symbol = ? AND date BETWEEN ? AND ?
-                ORDER BY date ASC
-                """,
-                (symbol, start_date, end_date),
+                _SELECT_HISTORIES_RANGE,
+                (json.dumps(list(symbols)), start_date or "", end_date or "9999-12-31"),
             )
-            rows = cursor.fetchall()
-            conn.close()
-            return [dict(row) for row in rows]
-        except Exception as e:
-            print(f"Error retrieving stock history range for {symbol}: {e}")
+            histories = {}
+            for symbol, rows in itertools.groupby(cursor.fetchall(), key=operator.itemgetter(0)):
+                _, dates, *numeric = zip(*rows)
+                columns = {"date": list(dates)}
+                for name, values in zip(_HISTORY_COLUMNS[1:], numeric):
+                    columns[name] = np.array(values, dtype=np.float64)
+                histories[symbol] = columns
+            return histories
+        except Exception:
+            log.exception("Error retrieving stock histories")
+            return {}
+
+    def get_stock_history_json(self, symbol, start_date=None, end_date=None):
+        """Return historical OHLC data ordered by date ASC as a JSON array string.
+
+        Rows have the same keys as get_stock_history. start_date/end_date
+        (inclusive ISO dates) narrow the range; an empty result gives "[]".
+        Returns None on error.
+        """
+        try:
+            cursor = self._reader().cursor()
+            cursor.execute(_SELECT_HISTORY_JSON, (symbol, start_date or "", end_date or "9999-12-31"))
+            return cursor.fetchone()[0]
+        except Exception:
+            log.exception("Error retrieving stock history for %s", symbol)
+            return None
+
+    def get_stock_history_range(self, symbol, start_date, end_date):
+        """Return historical OHLC data filtered by date range, ordered by date ASC."""
+        try:
+            cursor = self._reader().cursor()
+            cursor.execute(_SELECT_HISTORY_RANGE, (symbol, start_date, end_date))
+            return _fetch_dicts(cursor)
+        except Exception:
+            log.exception("Error retrieving stock history range for %s", symbol)
             return []
 
     def get_history_min_max(self, symbol):
         """Return (min_date, max_date) of cached history as ISO strings, or (None, None) if empty."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT MIN(date), MAX(date) FROM stock_history WHERE symbol = ?",
-                (symbol,),
-            )
+            cursor = self._reader().cursor()
+            cursor.execute(_SELECT_HISTORY_BOUNDS, (symbol,))
             row = cursor.fetchone()
-            conn.close()
             if row and row[0]:
                 return row[0], row[1]
             return None, None
-        except Exception as e:
-            print(f"Error getting history min/max for {symbol}: {e}")
+        except Exception:
+            log.exception("Error getting history min/max for %s", symbol)
             return None, None
 
     def has_history_coverage(self, symbol, start_date, end_date):
         """Check if stored history spans the requested date range (MIN <= start AND MAX >= end)."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT MIN(date) as min_date, MAX(date) as max_date FROM stock_history WHERE symbol = ?",
-                (symbol,),
-            )
+            cursor = self._reader().cursor()
+            cursor.execute(_SELECT_HISTORY_BOUNDS, (symbol,))
             row = cursor.fetchone()
-            conn.close()
             if row and row[0] and row[1]:
                 return row[0] <= start_date and row[1] >= end_date
             return False
-        except Exception as e:
-            print(f"Error checking history coverage for {symbol}: {e}")
+        except Exception:
+            log.exception("Error checking history coverage for %s", symbol)
             return False
 
     # ── Settings methods ──
 
     def get_setting(self, key):
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT value FROM app_settings WHERE key = ?", (key,))
-            row = cursor.fetchone()
-            conn.close()
-            return row[0] if row else None
-        except Exception as e:
-            print(f"Error getting setting {key}: {e}")
-            return None
+        return self._settings.get(key)
 
     def set_setting(self, key, value):
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT OR REPLACE INTO app_settings (key, value, updated_at) VALUES (?, ?, ?)",
-                (key, value, datetime.now().isoformat()),
-            )
-            conn.commit()
-            conn.close()
+            with self._transaction() as cursor:
+                cursor.execute(
+                    _UPSERT_SETTING,
+                    (key, value, datetime.now().isoformat()),
+                )
+            self._settings[key] = value
             return True
-        except Exception as e:
-            print(f"Error setting {key}: {e}")
+        except Exception:
+            log.exception("Error setting %s", key)
             return False
 
     def get_all_settings(self):
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT key, value FROM app_settings")
-            rows = cursor.fetchall()
-            conn.close()
-            return {row[0]: row[1] for row in rows}
-        except Exception as e:
-            print(f"Error getting all settings: {e}")
-            return {}
+        return dict(self._settings)
 
     # ── Portfolio methods ──
 
     def get_all_portfolios(self):
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
+            cursor = self._reader().cursor()
             cursor.execute("""
-                SELECT p.id, p.name, p.is_system, p.created_at,
+                SELECT p.id, p.name, p.is_system,
                        COUNT(ps.id) as symbol_count
                 FROM portfolios p
                 LEFT JOIN portfolio_symbols ps ON p.id = ps.portfolio_id
@@ -485,192 +883,146 @@ class StockDatabase:
                 ORDER BY p.is_system DESC, p.name ASC
             """)
             rows = cursor.fetchall()
-            conn.close()
             return [
                 {
-                    "id": row["id"],
-                    "name": row["name"],
-                    "is_system": bool(row["is_system"]),
-                    "symbol_count": row["symbol_count"],
+                    "id": pid,
+                    "name": name,
+                    "is_system": bool(is_system),
+                    "symbol_count": symbol_count,
                 }
-                for row in rows
+                for pid, name, is_system, symbol_count in rows
             ]
-        except Exception as e:
-            print(f"Error getting portfolios: {e}")
+        except Exception:
+            log.exception("Error getting portfolios")
             return []
 
     def get_portfolio(self, portfolio_id):
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, name, is_system, created_at FROM portfolios WHERE id = ?", (portfolio_id,))
-            row = cursor.fetchone()
-            if not row:
-                conn.close()
-                return None
+            # One LEFT JOIN round trip; an empty portfolio yields a single row with a NULL symbol.
+            cursor = self._reader().cursor()
             cursor.execute(
-                "SELECT symbol FROM portfolio_symbols WHERE portfolio_id = ? ORDER BY symbol ASC",
+                """
+                SELECT p.id, p.name, p.is_system, ps.symbol
+                FROM portfolios p
+                LEFT JOIN portfolio_symbols ps ON ps.portfolio_id = p.id
+                WHERE p.id = ?
+                ORDER BY ps.symbol ASC
+                """,
                 (portfolio_id,),
             )
-            symbols = [r["symbol"] for r in cursor.fetchall()]
-            conn.close()
+            rows = cursor.fetchall()
+            if not rows:
+                return None
+            row = rows[0]
+            symbols = [r[3] for r in rows if r[3] is not None]
             return {
-                "id": row["id"],
-                "name": row["name"],
-                "is_system": bool(row["is_system"]),
+                "id": row[0],
+                "name": row[1],
+                "is_system": bool(row[2]),
                 "symbols": symbols,
                 "symbol_count": len(symbols),
             }
-        except Exception as e:
-            print(f"Error getting portfolio {portfolio_id}: {e}")
+        except Exception:
+            log.exception("Error getting portfolio %s", portfolio_id)
             return None
 
     def create_portfolio(self, name):
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO portfolios (name, is_system, created_at) VALUES (?, 0, ?)",
-                (name, datetime.now().isoformat()),
-            )
-            conn.commit()
-            new_id = cursor.lastrowid
-            conn.close()
-            return new_id
+            with self._transaction() as cursor:
+                cursor.execute(
+                    "INSERT INTO portfolios (name, is_system, created_at) VALUES (?, 0, ?)",
+                    (name, datetime.now().isoformat()),
+                )
+                new_id = cursor.lastrowid
+                return new_id
         except sqlite3.IntegrityError:
             return None
-        except Exception as e:
-            print(f"Error creating portfolio: {e}")
+        except Exception:
+            log.exception("Error creating portfolio")
             return None
 
     def delete_portfolio(self, portfolio_id):
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT is_system FROM portfolios WHERE id = ?", (portfolio_id,))
-            row = cursor.fetchone()
-            if not row:
-                conn.close()
-                return False
-            if row[0] == 1:
-                conn.close()
-                return False  # Cannot delete system portfolio
-            cursor.execute("DELETE FROM portfolio_symbols WHERE portfolio_id = ?", (portfolio_id,))
-            cursor.execute("DELETE FROM portfolios WHERE id = ?", (portfolio_id,))
-            conn.commit()
-            conn.close()
-            return True
-        except Exception as e:
-            print(f"Error deleting portfolio {portfolio_id}: {e}")
+            with self._transaction() as cursor:
+                # System portfolios never match; portfolio_symbols rows go
+                # with the portfolio via ON DELETE CASCADE.
+                cursor.execute("DELETE FROM portfolios WHERE id = ? AND is_system = 0", (portfolio_id,))
+                return cursor.rowcount > 0
+        except Exception:
+            log.exception("Error deleting portfolio %s", portfolio_id)
             return False
 
+    def _is_user_portfolio(self, cursor, portfolio_id):
+        """True if portfolio_id exists and is not a system portfolio."""
+        cursor.execute("SELECT 1 FROM portfolios WHERE id = ? AND is_system = 0", (portfolio_id,))
+        return cursor.fetchone() is not None
+
     def set_portfolio_symbols(self, portfolio_id, symbols):
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT is_system FROM portfolios WHERE id = ?", (portfolio_id,))
-            row = cursor.fetchone()
-            if not row:
-                conn.close()
-                return False
-            if row[0] == 1:
-                conn.close()
-                return False  # Cannot modify system portfolio
-            cursor.execute("DELETE FROM portfolio_symbols WHERE portfolio_id = ?", (portfolio_id,))
-            cursor.executemany(
-                "INSERT OR IGNORE INTO portfolio_symbols (portfolio_id, symbol) VALUES (?, ?)",
-                [(portfolio_id, sym.upper()) for sym in symbols],
-            )
-            conn.commit()
-            conn.close()
-            return True
-        except Exception as e:
-            print(f"Error setting portfolio symbols: {e}")
+            with self._transaction() as cursor:
+                if not self._is_user_portfolio(cursor, portfolio_id):
+                    return False  # Missing, or a system portfolio (read-only)
+                cursor.execute("DELETE FROM portfolio_symbols WHERE portfolio_id = ?", (portfolio_id,))
+                cursor.executemany(
+                    "INSERT OR IGNORE INTO portfolio_symbols (portfolio_id, symbol) VALUES (?, UPPER(?))",
+                    ((portfolio_id, sym) for sym in symbols),
+                )
+                return True
+        except Exception:
+            log.exception("Error setting portfolio symbols")
             return False
 
     def add_portfolio_symbols(self, portfolio_id, symbols):
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT is_system FROM portfolios WHERE id = ?", (portfolio_id,))
-            row = cursor.fetchone()
-            if not row:
-                conn.close()
-                return False
-            if row[0] == 1:
-                conn.close()
-                return False
-            cursor.executemany(
-                "INSERT OR IGNORE INTO portfolio_symbols (portfolio_id, symbol) VALUES (?, ?)",
-                [(portfolio_id, sym.upper()) for sym in symbols],
-            )
-            conn.commit()
-            conn.close()
-            return True
-        except Exception as e:
-            print(f"Error adding portfolio symbols: {e}")
+            with self._transaction() as cursor:
+                if not self._is_user_portfolio(cursor, portfolio_id):
+                    return False
+                cursor.executemany(
+                    "INSERT OR IGNORE INTO portfolio_symbols (portfolio_id, symbol) VALUES (?, UPPER(?))",
+                    ((portfolio_id, sym) for sym in symbols),
+                )
+                return True
+        except Exception:
+            log.exception("Error adding portfolio symbols")
             return False
 
     def remove_portfolio_symbol(self, portfolio_id, symbol):
+        """Remove one symbol from a user portfolio. Returns True if a row was deleted."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT is_system FROM portfolios WHERE id = ?", (portfolio_id,))
-            row = cursor.fetchone()
-            if not row:
-                conn.close()
-                return False
-            if row[0] == 1:
-                conn.close()
-                return False
-            cursor.execute(
-                "DELETE FROM portfolio_symbols WHERE portfolio_id = ? AND symbol = ?",
-                (portfolio_id, symbol.upper()),
-            )
-            conn.commit()
-            conn.close()
-            return True
-        except Exception as e:
-            print(f"Error removing portfolio symbol: {e}")
+            with self._transaction() as cursor:
+                cursor.execute(
+                    """
+                    DELETE FROM portfolio_symbols
+                    WHERE portfolio_id = ? AND symbol = UPPER(?)
+                      AND portfolio_id IN (SELECT id FROM portfolios WHERE id = ? AND is_system = 0)
+                    """,
+                    (portfolio_id, symbol, portfolio_id),
+                )
+                return cursor.rowcount > 0
+        except Exception:
+            log.exception("Error removing portfolio symbol")
             return False
 
     def get_portfolio_symbols(self, portfolio_id):
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            cursor = self._reader().cursor()
             cursor.execute(
                 "SELECT symbol FROM portfolio_symbols WHERE portfolio_id = ? ORDER BY symbol ASC",
                 (portfolio_id,),
             )
             symbols = [row[0] for row in cursor.fetchall()]
-            conn.close()
             return symbols
-        except Exception as e:
-            print(f"Error getting portfolio symbols: {e}")
+        except Exception:
+            log.exception("Error getting portfolio symbols")
             return []
 
     def get_stocks_by_symbols(self, symbols):
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            placeholders = ",".join("?" for _ in symbols)
-            cursor.execute(
-                f"""
-                SELECT symbol, name, price, open, high, low, close, volume,
-                       change_percent, last_fetched, timestamp
-                FROM stock_cache
-                WHERE symbol IN ({placeholders})
-                ORDER BY symbol ASC
-                """,
-                symbols,
-            )
-            rows = cursor.fetchall()
-            conn.close()
-            return [dict(row) for row in rows]
-        except Exception as e:
-            print(f"Error getting stocks by symbols: {e}")
+            cursor = self._reader().cursor()
+            cursor.execute(_SELECT_STOCKS_IN, (json.dumps(list(symbols)),))
+            return _fetch_dicts(cursor)
+        except Exception:
+            log.exception("Error getting stocks by symbols")
             return []
 
     # ── Financial statements methods ──
@@ -678,42 +1030,34 @@ class StockDatabase:
     def save_financial_statements(self, symbol: str, rows: list[dict]) -> int:
         """Upsert quarterly income statement records. Returns count saved."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.executemany(
-                """
-                INSERT OR REPLACE INTO financial_statements
-                    (symbol, end_date, ann_date, total_revenue, revenue, total_profit,
-                     n_income, n_income_attr_p, operate_profit, total_cogs, oper_cost,
-                     income_tax, basic_eps, diluted_eps, fetched_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                [
-                    (
-                        symbol,
-                        r.get("end_date"),
-                        r.get("ann_date"),
-                        r.get("total_revenue"),
-                        r.get("revenue"),
-                        r.get("total_profit"),
-                        r.get("n_income"),
-                        r.get("n_income_attr_p"),
-                        r.get("operate_profit"),
-                        r.get("total_cogs"),
-                        r.get("oper_cost"),
-                        r.get("income_tax"),
-                        r.get("basic_eps"),
-                        r.get("diluted_eps"),
-                        datetime.now().isoformat(),
-                    )
-                    for r in rows
-                ],
-            )
-            conn.commit()
-            conn.close()
-            return len(rows)
-        except Exception as e:
-            print(f"Error saving financial statements for {symbol}: {e}")
+            now = datetime.now().isoformat()
+            with self._transaction() as cursor:
+                cursor.executemany(
+                    _UPSERT_FINANCIALS,
+                    [
+                        (
+                            symbol,
+                            r.get("end_date"),
+                            r.get("ann_date"),
+                            r.get("total_revenue"),
+                            r.get("revenue"),
+                            r.get("total_profit"),
+                            r.get("n_income"),
+                            r.get("n_income_attr_p"),
+                            r.get("operate_profit"),
+                            r.get("total_cogs"),
+                            r.get("oper_cost"),
+                            r.get("income_tax"),
+                            r.get("basic_eps"),
+                            r.get("diluted_eps"),
+                            now,
+                        )
+                        for r in rows
+                    ],
+                )
+                return len(rows)
+        except Exception:
+            log.exception("Error saving financial statements for %s", symbol)
             return 0
 
     def get_financial_statements(self, symbol: str,
@@ -721,9 +1065,7 @@ class StockDatabase:
                                   end_date: str | None = None) -> list[dict]:
         """Return financial statement rows ordered by end_date ASC. Dates in YYYYMMDD format."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
+            cursor = self._reader().cursor()
             if start_date and end_date:
                 cursor.execute(
                     """
@@ -748,85 +1090,127 @@ class StockDatabase:
                     """,
                     (symbol,),
                 )
-            rows = cursor.fetchall()
-            conn.close()
-            return [dict(row) for row in rows]
-        except Exception as e:
-            print(f"Error getting financial statements for {symbol}: {e}")
+            return _fetch_dicts(cursor)
+        except Exception:
+            log.exception("Error getting financial statements for %s", symbol)
             return []
 
     def get_financials_freshness(self, symbol: str) -> dict | None:
         """Return {max_end_date, fetched_at} for the most recent cached statement."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            # Two scalar subqueries so each MAX() is a single seek on its
+            # (symbol, ...) index; a combined MAX(a), MAX(b) scans the symbol.
+            cursor = self._reader().cursor()
             cursor.execute(
-                "SELECT MAX(end_date), MAX(fetched_at) FROM financial_statements WHERE symbol = ?",
-                (symbol,),
+                """
+                SELECT (SELECT MAX(end_date) FROM financial_statements WHERE symbol = ?),
+                       (SELECT MAX(fetched_at) FROM financial_statements WHERE symbol = ?)
+                """,
+                (symbol, symbol),
             )
             row = cursor.fetchone()
-            conn.close()
             if row and row[0]:
                 return {"max_end_date": row[0], "fetched_at": row[1]}
             return None
-        except Exception as e:
-            print(f"Error getting financials freshness for {symbol}: {e}")
+        except Exception:
+            log.exception("Error getting financials freshness for %s", symbol)
             return None
 
     def has_fresh_financials(self, symbol: str, max_age_days: int = 90) -> bool:
         """Return True if financial statements were fetched within max_age_days."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            # fetched_at is stored as a local ISO timestamp, so a string
+            # comparison against the cutoff can use idx_fs_symbol_fetched.
+            cutoff = (datetime.now() - timedelta(days=max_age_days)).isoformat()
+            cursor = self._reader().cursor()
             cursor.execute(
-                """
-                SELECT 1 FROM financial_statements
-                WHERE symbol = ?
-                  AND julianday('now') - julianday(fetched_at) <= ?
-                LIMIT 1
-                """,
-                (symbol, max_age_days),
+                "SELECT 1 FROM financial_statements WHERE symbol = ? AND fetched_at >= ? LIMIT 1",
+                (symbol, cutoff),
             )
             row = cursor.fetchone()
-            conn.close()
             return row is not None
-        except Exception as e:
-            print(f"Error checking financials freshness for {symbol}: {e}")
+        except Exception:
+            log.exception("Error checking financials freshness for %s", symbol)
             return False
 
+    def save_fundamentals(self, symbol: str, info: dict) -> bool:
+        """Cache a fundamentals snapshot (a dict of JSON-serializable values) for symbol."""
+        try:
+            with self._transaction() as cursor:
+                cursor.execute(
+                    _UPSERT_FUNDAMENTALS,
+                    (symbol, json.dumps(info), datetime.now().isoformat()),
+                )
+            return True
+        except Exception:
+            log.exception("Error saving fundamentals for %s", symbol)
+            return False
+
+    def get_fundamentals(self, symbol: str, max_age_hours: int = 24) -> dict | None:
+        """Return the cached fundamentals snapshot if fetched within max_age_hours, else None."""
+        try:
+            cutoff = (datetime.now() - timedelta(hours=max_age_hours)).isoformat()
+            cursor = self._reader().cursor()
+            cursor.execute(
+                "SELECT payload FROM fundamentals_cache WHERE symbol = ? AND fetched_at >= ?",
+                (symbol, cutoff),
+            )
+            row = cursor.fetchone()
+            return json.loads(row[0]) if row else None
+        except Exception:
+            log.exception("Error getting fundamentals for %s", symbol)
+            return None
+
     def clear_all(self):
+        """Clear all cached market data (quotes, history, financials, fundamentals) in one transaction.
+
+        Settings and portfolios are kept. Unqualified DELETEs let SQLite use its
+        truncate optimization and free whole pages (none of these tables is a
+        foreign-key parent or has triggers); secure_delete=OFF skips
+        zero-filling them. The WAL is checkpointed and truncated afterwards so
+        the freed pages don't linger in the -wal file.
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM stock_cache")
-            conn.commit()
-            conn.close()
+            with self._transaction() as cursor:
+                cursor.execute("PRAGMA secure_delete=OFF")
+                cursor.execute("DELETE FROM stock_cache")
+                cursor.execute("DELETE FROM stock_history")
+                cursor.execute("DELETE FROM financial_statements")
+                cursor.execute("DELETE FROM fundamentals_cache")
+            self._symbols.clear()
+            with self._lock:
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
             return True
-        except Exception as e:
-            print(f"Error clearing database: {e}")
+        except Exception:
+            log.exception("Error clearing database")
             return False
 
     def clear_symbol_data(self, symbol):
         """Clear all cached data for a specific symbol from all tables."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Clear from stock_cache
-            cursor.execute("DELETE FROM stock_cache WHERE symbol = ?", (symbol,))
-            
-            # Clear from stock_history
-            cursor.execute("DELETE FROM stock_history WHERE symbol = ?", (symbol,))
-            
-            # Clear from financial_statements
-            cursor.execute("DELETE FROM financial_statements WHERE symbol = ?", (symbol,))
-            
-            conn.commit()
-            conn.close()
+            with self._transaction() as cursor:
+                # Clear from stock_cache
+                cursor.execute("DELETE FROM stock_cache WHERE symbol = ?", (symbol,))
+
+                # Clear from stock_history
+                cursor.execute("DELETE FROM stock_history WHERE symbol = ?", (symbol,))
+
+                # Clear from financial_statements
+                cursor.execute("DELETE FROM financial_statements WHERE symbol = ?", (symbol,))
+                cursor.execute("DELETE FROM fundamentals_cache WHERE symbol = ?", (symbol,))
+
+            self._symbols.discard(symbol)
             return True
-        except Exception as e:
-            print(f"Error clearing data for {symbol}: {e}")
+        except Exception:
+            log.exception("Error clearing data for %s", symbol)
             return False
 
 
-stock_db = StockDatabase()
+@functools.cache
+def get_db() -> StockDatabase:
+    """Return the process-wide StockDatabase, opening it on first use.
+
+    Importing this module no longer touches the database file; schema setup
+    and migrations run on the first call.
+    """
+    return StockDatabase()
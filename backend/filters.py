@@ -24,14 +24,27 @@ filters.json next to this file.
 """
 
 import json
+import logging
+import operator
 import os
-import pandas as pd
+import threading
+from collections import OrderedDict
+import numpy as np
 from typing import Any
-
-from strategies.indicators import sma, rsi as rsi_fn, daily_change_pct
+from numpy.lib.stride_tricks import sliding_window_view
 
 _FILTERS_FILE = os.path.join(os.path.dirname(__file__), "filters.json")
 
+log = logging.getLogger(__name__)
+
+# Indicator names understood by _compute_indicators (see module docstring)
+INDICATORS = frozenset({"price", "ma50", "ma100", "rsi", "change_pct", "volume"})
+
+# Indicator values per (symbol, data revision); see get_indicator_values
+_INDICATOR_CACHE_SIZE = 512
+_indicator_cache: OrderedDict[tuple, dict[str, Any] | None] = OrderedDict()
+_indicator_cache_lock = threading.Lock()  # /api/screen evaluates symbols on a thread pool
+
 BUILTIN_FILTERS: list[dict] = [
     {
         "name": "Golden Cross",
@@ -77,13 +90,50 @@ BUILTIN_FILTERS: list[dict] = [
 ]
 
 
+_COMPARATORS = {
+    ">": operator.gt,
+    "<": operator.lt,
+    ">=": operator.ge,
+    "<=": operator.le,
+    "==": lambda a, b: abs(a - b) < 1e-9,
+}
+
+
+def _never(a, b) -> bool:
+    return False
+
+
+def compile_conditions(conditions: list[dict]) -> list[tuple]:
+    """Pre-resolve conditions into (get_left, get_right, op) callables over an indicator-values dict.
+
+    Done once per filter definition, so evaluation skips the per-condition
+    dict lookups and the isinstance check on the right-hand side.
+    """
+    compiled = []
+    for cond in conditions:
+        left_key = cond.get("indicator")
+        right_raw = cond.get("value")
+        get_left = lambda v, k=left_key: v.get(k)
+        if isinstance(right_raw, str):
+            get_right = lambda v, k=right_raw: v.get(k)
+        else:
+            get_right = lambda v, c=right_raw: c
+        compiled.append((get_left, get_right, _COMPARATORS.get(cond.get("comparator", ">"), _never)))
+    return compiled
+
+
 class FilterRegistry:
     def __init__(self) -> None:
         self._filters: dict[str, dict] = {}
+        self._compiled: dict[str, list[tuple]] = {}
         for f in BUILTIN_FILTERS:
-            self._filters[f["name"]] = f
+            self._register(f)
         self._load_user_filters()
 
+    def _register(self, filter_def: dict) -> None:
+        self._filters[filter_def["name"]] = filter_def
+        self._compiled[filter_def["name"]] = compile_conditions(filter_def.get("conditions", []))
+
     def _load_user_filters(self) -> None:
         if os.path.exists(_FILTERS_FILE):
             try:
@@ -92,9 +142,9 @@ class FilterRegistry:
                 for f in user:
                     if f.get("name") and f["name"] not in {b["name"] for b in BUILTIN_FILTERS}:
                         f["builtin"] = False
-                        self._filters[f["name"]] = f
+                        self._register(f)
             except Exception as e:
-                print(f"Failed to load user filters: {e}")
+                log.warning("Failed to load user filters: %s", e)
 
     def _save_user_filters(self) -> None:
         user = [f for f in self._filters.values() if not f.get("builtin")]
@@ -102,7 +152,7 @@ class FilterRegistry:
             with open(_FILTERS_FILE, "w") as fp:
                 json.dump(user, fp, indent=2)
         except Exception as e:
-            print(f"Failed to save user filters: {e}")
+            log.warning("Failed to save user filters: %s", e)
 
     def list_all(self) -> list[dict]:
         return list(self._filters.values())
@@ -110,10 +160,13 @@ class FilterRegistry:
     def get(self, name: str) -> dict | None:
         return self._filters.get(name)
 
+    def get_compiled(self, name: str) -> list[tuple] | None:
+        """The filter's conditions as compiled by compile_conditions, for evaluate_compiled."""
+        return self._compiled.get(name)
+
     def add(self, filter_def: dict) -> None:
-        name = filter_def["name"]
         filter_def["builtin"] = False
-        self._filters[name] = filter_def
+        self._register(filter_def)
         self._save_user_filters()
 
     def remove(self, name: str) -> bool:
@@ -123,6 +176,7 @@ class FilterRegistry:
         if f.get("builtin"):
             return False
         del self._filters[name]
+        del self._compiled[name]
         self._save_user_filters()
         return True
 
@@ -130,74 +184,175 @@ class FilterRegistry:
 filter_registry = FilterRegistry()
 
 
-def _compute_indicators(history_rows: list[dict]) -> dict[str, Any] | None:
-    """Compute all supported indicator values from history rows. Returns None if insufficient data."""
-    if not history_rows or len(history_rows) < 2:
+def _column(history_rows: list[dict] | dict[str, Any], name: str) -> np.ndarray:
+    """One history column as float64 with missing values dropped (None/NaN)."""
+    if isinstance(history_rows, dict):
+        col = np.asarray(history_rows[name], dtype=np.float64)
+    else:
+        col = np.array([r[name] for r in history_rows], dtype=np.float64)
+    return col[~np.isnan(col)]
+
+
+def _last_sma(closes: np.ndarray, period: int) -> float | None:
+    """Last value of sma(closes, period), i.e. the mean of the final window."""
+    return float(closes[-period:].mean()) if len(closes) >= period else None
+
+
+def _last_rsi(closes: np.ndarray, period: int = 14) -> float | None:
+    """Last defined value of strategies.indicators.rsi, computed on arrays.
+
+    Same definition: rolling means of gains/losses (the first bar counts as
+    a zero change), undefined where the average loss is zero.
+    """
+    if len(closes) < period:
+        return None
+    delta = np.diff(closes, prepend=np.nan)
+    gain = np.where(delta > 0, delta, 0.0)
+    loss = np.where(delta < 0, -delta, 0.0)
+
+    # Usual case: the final window has a down move, so only it is needed
+    avg_loss = loss[-period:].mean()
+    if avg_loss != 0:
+        return float(100 - (100 / (1 + gain[-period:].mean() / avg_loss)))
+
+    # Otherwise fall back to the last window that had one
+    avg_gain = sliding_window_view(gain, period).mean(axis=1)
+    avg_loss = sliding_window_view(loss, period).mean(axis=1)
+    defined = np.flatnonzero(avg_loss != 0)
+    if defined.size == 0:
         return None
+    i = defined[-1]
+    return float(100 - (100 / (1 + avg_gain[i] / avg_loss[i])))
+
 
-    df = pd.DataFrame(history_rows)
-    closes = df["close"].dropna()
-    volumes = df["volume"].dropna()
+def _last_change_pct(closes: np.ndarray) -> float | None:
+    """Last defined value of daily_change_pct(closes); only 0/0 is undefined."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if len(closes) >= 2:
+            last = (closes[-1] / closes[-2] - 1) * 100
+            if not np.isnan(last):
+                return float(last)
+        chg = (closes[1:] / closes[:-1] - 1) * 100
+    chg = chg[~np.isnan(chg)]
+    return float(chg[-1]) if chg.size else None
 
-    if closes.empty:
+
+def required_indicators(conditions: list[dict]) -> frozenset[str]:
+    """Indicator names referenced by conditions, on either side of the comparison."""
+    needed = set()
+    for cond in conditions:
+        needed.add(cond.get("indicator"))
+        if isinstance(cond.get("value"), str):
+            needed.add(cond["value"])
+    return frozenset(needed & INDICATORS)
+
+
+def _compute_indicators(history_rows: list[dict] | dict[str, Any],
+                        needed: frozenset[str] | None = None) -> dict[str, Any] | None:
+    """Compute supported indicator values from history rows (or per-column lists). Returns None if insufficient data.
+
+    Only the latest value of each indicator is needed, so this works on numpy
+    arrays and reads just the final window (100 bars at most) of each one
+    rather than building full pandas series. needed limits the work to those
+    indicators (default: all); the others are left out of the result.
+    """
+    if not history_rows:
+        return None
+
+    row_count = len(history_rows["date"]) if isinstance(history_rows, dict) else len(history_rows)
+    if row_count < 2:
         return None
+    closes = _column(history_rows, "close")
 
+    if closes.size == 0:
+        return None
+
+    if needed is None:
+        needed = INDICATORS
     values: dict[str, Any] = {}
-    values["price"] = float(closes.iloc[-1])
-    values["volume"] = float(volumes.iloc[-1]) if not volumes.empty else None
+    if "price" in needed:
+        values["price"] = float(closes[-1])
+    if "volume" in needed:
+        volumes = _column(history_rows, "volume")
+        values["volume"] = float(volumes[-1]) if volumes.size else None
+    if "ma50" in needed:
+        values["ma50"] = _last_sma(closes, 50)
+    if "ma100" in needed:
+        values["ma100"] = _last_sma(closes, 100)
+    if "rsi" in needed:
+        values["rsi"] = _last_rsi(closes, 14)
+    if "change_pct" in needed:
+        values["change_pct"] = _last_change_pct(closes)
 
-    ma50_s = sma(closes, 50)
-    values["ma50"] = float(ma50_s.dropna().iloc[-1]) if not ma50_s.dropna().empty else None
+    return values
 
-    ma100_s = sma(closes, 100)
-    values["ma100"] = float(ma100_s.dropna().iloc[-1]) if not ma100_s.dropna().empty else None
 
-    rsi_s = rsi_fn(closes, 14)
-    values["rsi"] = float(rsi_s.dropna().iloc[-1]) if not rsi_s.dropna().empty else None
+def _history_revision(history_rows: list[dict] | dict[str, Any]) -> tuple | None:
+    """(last date, row count, last close) identifying one revision of a symbol's history."""
+    if isinstance(history_rows, dict):
+        dates = history_rows.get("date")
+        if dates is None or len(dates) == 0:
+            return None
+        last_close = float(history_rows["close"][-1])
+        return (dates[-1], len(dates), last_close if last_close == last_close else None)
+    if not history_rows:
+        return None
+    last = history_rows[-1]
+    return (last["date"], len(history_rows), last["close"])
+
 
-    chg = daily_change_pct(closes).dropna()
-    values["change_pct"] = float(chg.iloc[-1]) if not chg.empty else None
+def get_indicator_values(symbol: str, history_rows: list[dict] | dict[str, Any],
+                         needed: frozenset[str] | None = None) -> dict[str, Any] | None:
+    """_compute_indicators, memoized per symbol, history revision and indicator set (LRU).
 
+    The key includes the last close so a same-day refresh of the latest bar
+    is not served stale values.
+    """
+    revision = _history_revision(history_rows)
+    if revision is None:
+        return None
+    if needed is None:
+        needed = INDICATORS
+    key = (symbol, *revision, needed)
+    with _indicator_cache_lock:
+        if key in _indicator_cache:
+            _indicator_cache.move_to_end(key)
+            return _indicator_cache[key]
+    values = _compute_indicators(history_rows, needed)
+    with _indicator_cache_lock:
+        _indicator_cache[key] = values
+        if len(_indicator_cache) > _INDICATOR_CACHE_SIZE:
+            _indicator_cache.popitem(last=False)
     return values
 
 
-def evaluate_filter(history_rows: list[dict], conditions: list[dict]) -> bool:
+def evaluate_filter(history_rows: list[dict] | dict[str, Any], conditions: list[dict]) -> bool:
     """Return True if a stock's history satisfies all filter conditions (AND logic)."""
     if not conditions:
         return True
+    return evaluate_conditions(_compute_indicators(history_rows), conditions)
 
-    values = _compute_indicators(history_rows)
-    if values is None:
-        return False
 
-    comparators = {
-        ">": lambda a, b: a > b,
-        "<": lambda a, b: a < b,
-        ">=": lambda a, b: a >= b,
-        "<=": lambda a, b: a <= b,
-        "==": lambda a, b: abs(a - b) < 1e-9,
-    }
+def evaluate_conditions(values: dict[str, Any] | None, conditions: list[dict]) -> bool:
+    """Return True if precomputed indicator values satisfy all conditions (AND logic)."""
+    return evaluate_compiled(values, compile_conditions(conditions))
 
-    for cond in conditions:
-        left_key = cond.get("indicator")
-        right_raw = cond.get("value")
-        comp = cond.get("comparator", ">")
 
-        left = values.get(left_key)
-        if left is None:
-            return False
+def evaluate_compiled(values: dict[str, Any] | None, compiled: list[tuple]) -> bool:
+    """Return True if precomputed indicator values satisfy all compiled conditions (AND logic)."""
+    if not compiled:
+        return True
 
-        # Right side can be a string (indicator name) or a numeric value
-        if isinstance(right_raw, str):
-            right = values.get(right_raw)
-        else:
-            right = right_raw
+    if values is None:
+        return False
 
-        if right is None:
+    for get_left, get_right, op in compiled:
+        left = get_left(values)
+        if left is None:
             return False
-
-        fn = comparators.get(comp)
-        if fn is None or not fn(left, right):
+        # Right side is another indicator's value or a numeric constant
+        right = get_right(values)
+        if right is None or not op(left, right):
             return False
 
     return True
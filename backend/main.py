@@ -1,25 +1,118 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 import uvicorn
 import asyncio
 
-from db import stock_db, NASDAQ_100_SYMBOLS
+from db import get_db, NASDAQ_100_SYMBOLS
 from strategies.loader import strategy_loader
 from strategies.json_strategy import JsonStrategy
 from strategies.backtest_engine import run_backtest
-from filters import filter_registry, evaluate_filter, condition_label
-
+from strategies.indicators import sma, rsi as rsi_fn, macd as macd_fn, bollinger_bands, daily_change_pct as dcp_fn
+from filters import filter_registry, evaluate_compiled, get_indicator_values, required_indicators, condition_label
+
+import csv
+import hashlib
+import hmac
+import itertools
+import json
+import logging
+import logging.handlers
+import multiprocessing
 import os
+import pickle
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import asynccontextmanager
+import numpy as np
+import orjson
 import pandas as pd
 from datetime import datetime, date, timedelta
 from typing import Optional
 
-app = FastAPI(title="Gravion Backend", version="2.0.0")
+# The data-source clients (yfinance, tushare, requests) are imported inside
+# the functions that call them: only the configured source is ever needed,
+# yfinance and tushare are slow to import, and spawned backtest workers
+# re-import this module without using any of them.
+
+
+def _configure_logging() -> None:
+    """Console plus a rotating file next to this module; a no-op if the host
+    (e.g. a test runner) already configured the root logger."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+        handlers=[
+            logging.StreamHandler(),
+            logging.handlers.RotatingFileHandler(
+                os.path.join(os.path.dirname(__file__), "gravion.log"),
+                maxBytes=5 * 1024 * 1024, backupCount=3, delay=True,
+            ),
+        ],
+    )
+
+
+log = logging.getLogger(__name__)
+
+
+class _OrjsonResponse(JSONResponse):
+    """JSONResponse rendered by orjson (C encoder; numpy scalars/arrays supported, NaN/inf become null).
 
-# Scan user strategies directory at startup
-_user_dir = os.path.join(os.path.dirname(__file__), "strategies", "user")
-strategy_loader.scan_directory(_user_dir)
+    Used as the app's default response class. Endpoints with large payloads
+    return it directly, which also skips FastAPI's jsonable_encoder pass.
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+
+# User strategy files, scanned at startup
+_USER_STRATEGIES_DIR = os.path.join(os.path.dirname(__file__), "strategies", "user")
+
+# Upper bound on batch-backtest worker processes
+_BACKTEST_WORKERS = 4
+
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    # Process setup lives here rather than at import time: spawned backtest
+    # workers re-import this module (as __mp_main__ when it is run as a
+    # script) and must not reconfigure logging or rescan strategy files.
+    _configure_logging()
+    strategy_loader.scan_directory(_USER_STRATEGIES_DIR)
+    # Open the database (schema setup, migrations) before serving requests
+    get_db()
+    # Worker pools belong to one run of the app, so a restarted lifespan
+    # (a second TestClient, an embedded server) starts with fresh ones.
+    # Screening threads are long-lived so each keeps its SQLite reader
+    # connection; numpy/pandas and SQLite release the GIL for much of the work.
+    app.state.screen_pool = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1),
+                                               thread_name_prefix="screen")
+    # Processes for batch backtests: run_backtest is pure-Python per-row work,
+    # so threads would serialize on the GIL. Spawned (not forked) so workers
+    # inherit none of this process's threads or open SQLite handles; capped
+    # since each worker is a full interpreter with pandas loaded.
+    app.state.backtest_pool = ProcessPoolExecutor(max_workers=min(_BACKTEST_WORKERS, os.cpu_count() or 1),
+                                                  mp_context=multiprocessing.get_context("spawn"))
+    # History downloads; long-lived like the screen pool, so its threads keep
+    # their SQLite readers across requests
+    app.state.prefetch_pool = ThreadPoolExecutor(max_workers=_PREFETCH_WORKERS, thread_name_prefix="prefetch")
+    yield
+    app.state.screen_pool.shutdown(wait=True)
+    app.state.backtest_pool.shutdown(wait=True)
+    app.state.prefetch_pool.shutdown(wait=True)
+    # Release the database connections on shutdown (runs PRAGMA optimize
+    # first); the next get_db() call opens a fresh instance
+    get_db().close()
+    get_db.cache_clear()
+
+
+app = FastAPI(title="Gravion Backend", version="2.0.0", lifespan=_lifespan,
+              default_response_class=_OrjsonResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -31,10 +124,10 @@ app.add_middleware(
 
 def _get_system_portfolio_symbols():
     """Get symbols from the NASDAQ 100 system portfolio, falling back to constant."""
-    portfolios = stock_db.get_all_portfolios()
+    portfolios = get_db().get_all_portfolios()
     for p in portfolios:
         if p.get("is_system"):
-            syms = stock_db.get_portfolio_symbols(p["id"])
+            syms = get_db().get_portfolio_symbols(p["id"])
             if syms:
                 return syms
     return NASDAQ_100_SYMBOLS
@@ -57,11 +150,15 @@ def compute_signal(stock: dict) -> str:
 
 def _get_global_date_range():
     """Return (start_date, end_date) from global settings, or (None, None) if not configured."""
-    g_start = stock_db.get_setting("global_start_date") or ""
-    g_end = stock_db.get_setting("global_end_date") or ""
+    g_start = get_db().get_setting("global_start_date") or ""
+    g_end = get_db().get_setting("global_end_date") or ""
     return (g_start or None, g_end or None)
 
 
+# Lookback in days for each period string accepted by the API
+_PERIOD_DAYS = {"6mo": 183, "1y": 365, "2y": 730, "5y": 1825}
+
+
 def resolve_date_range(start_date: str | None, end_date: str | None, period: str | None):
     """Convert period strings to concrete start/end dates.
     Priority: explicit args > global settings > period fallback.
@@ -75,19 +172,17 @@ def resolve_date_range(start_date: str | None, end_date: str | None, period: str
         return g_start, g_end
 
     end = date.today()
-    period_map = {"6mo": 183, "1y": 365, "2y": 730, "5y": 1825}
-    days = period_map.get(period or "1y", 365)
+    days = _PERIOD_DAYS.get(period or "1y", 365)
     start = end - timedelta(days=days)
     return start.isoformat(), end.isoformat()
 
 
-def ensure_history(symbol: str, start_date: str, end_date: str):
-    """Fetch only the missing date segments for a symbol using the configured data source."""
-    if stock_db.has_history_coverage(symbol, start_date, end_date):
-        return True
-    data_source = stock_db.get_setting("data_source") or "yahoo_finance"
+def _fetch_missing_history(symbol: str, start_date: str, end_date: str) -> list[list[dict]]:
+    """Download the missing date segments for a symbol using the configured data source, without saving.
+    Returns one list of rows per segment that returned data."""
+    data_source = get_db().get_setting("data_source") or "yahoo_finance"
     segments = _get_missing_segments(symbol, start_date, end_date)
-    fetched_any = False
+    fetched: list[list[dict]] = []
     for seg_start, seg_end in segments:
         try:
             if data_source == "tushare":
@@ -97,11 +192,52 @@ def ensure_history(symbol: str, start_date: str, end_date: str):
             else:
                 rows = _fetch_yfinance_history(symbol, start_date=seg_start, end_date=seg_end)
             if rows:
-                stock_db.save_stock_history(symbol, rows)
-                fetched_any = True
+                fetched.append(rows)
         except Exception as e:
-            print(f"ensure_history segment {seg_start}–{seg_end} failed for {symbol}: {e}")
-    return fetched_any or stock_db.has_history_coverage(symbol, start_date, end_date)
+            log.warning("ensure_history segment %s–%s failed for %s: %s", seg_start, seg_end, symbol, e)
+    return fetched
+
+
+# Concurrent history downloads (batch-backtest prefetch, precache) on the
+# lifespan's prefetch_pool; bounded to stay under the data sources' rate limits
+_PREFETCH_WORKERS = 4
+
+
+def _fetch_missing_histories(symbols: list[str], start_date: str, end_date: str) -> dict[str, list[list[dict]]]:
+    """_fetch_missing_history for several symbols, keyed by symbol (symbols without data are absent).
+    On yfinance, symbols missing the same date segment share one multi-ticker download.
+    The downloads run concurrently on the prefetch pool."""
+    pool = app.state.prefetch_pool
+    data_source = get_db().get_setting("data_source") or "yahoo_finance"
+    fetched: dict[str, list[list[dict]]] = {}
+    if data_source in ("tushare", "binance"):
+        for sym, segments in zip(symbols, pool.map(
+            lambda sym: _fetch_missing_history(sym, start_date, end_date), symbols
+        )):
+            if segments:
+                fetched[sym] = segments
+        return fetched
+
+    by_segment: dict[tuple[str, str], list[str]] = {}
+    for sym in symbols:
+        for segment in _get_missing_segments(sym, start_date, end_date):
+            by_segment.setdefault(segment, []).append(sym)
+    # Segments are merged in a fixed order so each symbol's list is deterministic
+    for histories in pool.map(lambda item: _fetch_yfinance_histories(item[1], *item[0]), by_segment.items()):
+        for sym, rows in histories.items():
+            fetched.setdefault(sym, []).append(rows)
+    return fetched
+
+
+def ensure_history(symbol: str, start_date: str, end_date: str):
+    """Fetch only the missing date segments for a symbol using the configured data source."""
+    if get_db().has_history_coverage(symbol, start_date, end_date):
+        return True
+    segments = _fetch_missing_history(symbol, start_date, end_date)
+    if segments:
+        get_db().save_many_histories((symbol, rows) for rows in segments)
+        return True
+    return get_db().has_history_coverage(symbol, start_date, end_date)
 
 
 class SettingsUpdateRequest(BaseModel):
@@ -150,7 +286,7 @@ async def health():
 
 @app.get("/api/settings")
 async def get_settings():
-    settings = stock_db.get_all_settings()
+    settings = get_db().get_all_settings()
     return {
         "data_source": settings.get("data_source", "yahoo_finance"),
         "global_start_date": settings.get("global_start_date", ""),
@@ -164,18 +300,18 @@ async def get_settings():
 @app.put("/api/settings")
 async def update_settings(body: SettingsUpdateRequest):
     if body.data_source is not None:
-        stock_db.set_setting("data_source", body.data_source)
+        get_db().set_setting("data_source", body.data_source)
     if body.global_start_date is not None:
-        stock_db.set_setting("global_start_date", body.global_start_date)
+        get_db().set_setting("global_start_date", body.global_start_date)
     if body.global_end_date is not None:
-        stock_db.set_setting("global_end_date", body.global_end_date)
+        get_db().set_setting("global_end_date", body.global_end_date)
     if body.tushare_api_key is not None:
-        stock_db.set_setting("tushare_api_key", body.tushare_api_key)
+        get_db().set_setting("tushare_api_key", body.tushare_api_key)
     if body.binance_api_key is not None:
-        stock_db.set_setting("binance_api_key", body.binance_api_key)
+        get_db().set_setting("binance_api_key", body.binance_api_key)
     if body.binance_api_secret is not None:
-        stock_db.set_setting("binance_api_secret", body.binance_api_secret)
-    settings = stock_db.get_all_settings()
+        get_db().set_setting("binance_api_secret", body.binance_api_secret)
+    settings = get_db().get_all_settings()
     return {
         "success": True,
         "data_source": settings.get("data_source", "yahoo_finance"),
@@ -191,12 +327,12 @@ async def update_settings(body: SettingsUpdateRequest):
 
 @app.get("/api/portfolios")
 async def list_portfolios():
-    return {"portfolios": stock_db.get_all_portfolios()}
+    return {"portfolios": get_db().get_all_portfolios()}
 
 
 @app.post("/api/portfolios")
 async def create_portfolio(body: CreatePortfolioRequest):
-    new_id = stock_db.create_portfolio(body.name)
+    new_id = get_db().create_portfolio(body.name)
     if new_id is None:
         return {"success": False, "error": f"Portfolio '{body.name}' already exists"}
     return {"success": True, "id": new_id, "name": body.name}
@@ -204,7 +340,7 @@ async def create_portfolio(body: CreatePortfolioRequest):
 
 @app.get("/api/portfolios/{portfolio_id}")
 async def get_portfolio(portfolio_id: int):
-    portfolio = stock_db.get_portfolio(portfolio_id)
+    portfolio = get_db().get_portfolio(portfolio_id)
     if not portfolio:
         return {"success": False, "error": "Portfolio not found"}
     return {"success": True, **portfolio}
@@ -212,25 +348,25 @@ async def get_portfolio(portfolio_id: int):
 
 @app.delete("/api/portfolios/{portfolio_id}")
 async def delete_portfolio(portfolio_id: int):
-    portfolio = stock_db.get_portfolio(portfolio_id)
+    portfolio = get_db().get_portfolio(portfolio_id)
     if not portfolio:
         return {"success": False, "error": "Portfolio not found"}
     if portfolio["is_system"]:
         return {"success": False, "error": "Cannot delete system portfolio"}
-    result = stock_db.delete_portfolio(portfolio_id)
+    result = get_db().delete_portfolio(portfolio_id)
     return {"success": result}
 
 
 @app.put("/api/portfolios/{portfolio_id}/symbols")
 async def update_portfolio_symbols(portfolio_id: int, body: UpdatePortfolioSymbolsRequest):
-    portfolio = stock_db.get_portfolio(portfolio_id)
+    portfolio = get_db().get_portfolio(portfolio_id)
     if not portfolio:
         return {"success": False, "error": "Portfolio not found"}
     if portfolio["is_system"]:
         return {"success": False, "error": "Cannot modify system portfolio symbols"}
-    result = stock_db.set_portfolio_symbols(portfolio_id, body.symbols)
+    result = get_db().set_portfolio_symbols(portfolio_id, body.symbols)
     if result:
-        updated = stock_db.get_portfolio(portfolio_id)
+        updated = get_db().get_portfolio(portfolio_id)
         return {"success": True, "symbols": updated["symbols"], "symbol_count": updated["symbol_count"]}
     return {"success": False, "error": "Failed to update symbols"}
 
@@ -242,33 +378,36 @@ async def fetch_data(body: Optional[FetchRequest] = None):
     Accepts optional body with portfolio_id or symbols list.
     Saves OHLC + metadata to SQLite. Returns summary only.
     """
+    # Network downloads and the DB write block; keep them off the event loop
+    return await asyncio.to_thread(_do_fetch, body)
+
+
+def _do_fetch(body: Optional[FetchRequest]) -> dict:
+    """Blocking body of /api/fetch, run in a worker thread."""
     try:
         # Check data source setting
-        data_source = stock_db.get_setting("data_source") or "yahoo_finance"
+        data_source = get_db().get_setting("data_source") or "yahoo_finance"
         if data_source == "moomoo_opend":
             return {"success": False, "error": "Moomoo OpenD gateway is not configured. Please install and connect the Moomoo OpenD gateway first."}
 
-        from datetime import datetime
-        import math
-
         # Resolve symbols from body
         if body and body.symbols:
             symbols = [s.upper() for s in body.symbols]
         elif body and body.portfolio_id:
-            symbols = stock_db.get_portfolio_symbols(body.portfolio_id)
+            symbols = get_db().get_portfolio_symbols(body.portfolio_id)
             if not symbols:
                 return {"success": False, "error": "Portfolio not found or has no symbols"}
         else:
             symbols = _get_system_portfolio_symbols()
 
         fetch_time = datetime.now().isoformat()
-        fetched_count = 0
+        pending: list[dict] = []  # rows written to stock_cache in one batch after the fetch loop
         errors = []
 
         if data_source == "tushare":
             try:
                 import tushare as ts
-                api_key = stock_db.get_setting("tushare_api_key")
+                api_key = get_db().get_setting("tushare_api_key")
                 if not api_key:
                     return {"success": False, "error": "Tushare API key not configured. Please set tushare_api_key in settings."}
                 pro = ts.pro_api(api_key)
@@ -316,7 +455,7 @@ async def fetch_data(body: Optional[FetchRequest] = None):
                         else:
                             change_pct = 0.0
 
-                        stock_db.save_stock_data(
+                        pending.append(dict(
                             symbol=sym,
                             name=name,
                             price=close_val,
@@ -327,14 +466,13 @@ async def fetch_data(body: Optional[FetchRequest] = None):
                             low_price=low_val,
                             close_price=close_val,
                             last_fetched=fetch_time,
-                        )
-                        fetched_count += 1
+                        ))
                         
                     except Exception as e:
                         errors.append(f"{sym}: {str(e)}")
 
             except Exception as e:
-                print(f"Tushare fetch failed: {e}")
+                log.warning("Tushare fetch failed: %s", e)
                 return {"success": False, "error": f"Tushare API error: {str(e)}"}
 
         elif data_source == "binance":
@@ -356,7 +494,7 @@ async def fetch_data(body: Optional[FetchRequest] = None):
                     volume_val = int(float(ticker.get("volume") or 0))
                     change_pct = round(float(ticker.get("priceChangePercent") or 0), 2)
 
-                    stock_db.save_stock_data(
+                    pending.append(dict(
                         symbol=sym,
                         name=sym,
                         price=close_val,
@@ -367,8 +505,7 @@ async def fetch_data(body: Optional[FetchRequest] = None):
                         low_price=low_val,
                         close_price=close_val,
                         last_fetched=fetch_time,
-                    )
-                    fetched_count += 1
+                    ))
                 except Exception as e:
                     errors.append(f"{sym}: {str(e)}")
 
@@ -378,42 +515,28 @@ async def fetch_data(body: Optional[FetchRequest] = None):
             
             # Batch download: single HTTP call for all symbols
             data = yf.download(symbols, period="2d", group_by="ticker", threads=True)
+            quotes = _latest_quotes(data, symbols)
 
             for symbol in symbols:
                 try:
-                    # Extract per-symbol data from the multi-level DataFrame
-                    if len(symbols) == 1:
-                        hist = data
-                    else:
-                        hist = data[symbol]
-
-                    if hist.empty or hist["Close"].dropna().empty:
+                    quote = quotes.get(symbol)
+                    if quote is None:
                         errors.append(f"{symbol}: no data")
                         continue
+                    if None in (quote["open"], quote["high"], quote["low"], quote["volume"]):
+                        errors.append(f"{symbol}: incomplete OHLCV data")
+                        continue
 
-                    close_val = float(hist["Close"].dropna().iloc[-1])
-                    open_val = float(hist["Open"].dropna().iloc[-1])
-                    high_val = float(hist["High"].dropna().iloc[-1])
-                    low_val = float(hist["Low"].dropna().iloc[-1])
-                    volume_val = int(hist["Volume"].dropna().iloc[-1])
-
-                    # Calculate daily change percent
-                    close_series = hist["Close"].dropna()
-                    if len(close_series) >= 2:
-                        prev_close = float(close_series.iloc[-2])
-                        if prev_close != 0:
-                            change_pct = round(((close_val - prev_close) / prev_close) * 100, 2)
-                        else:
-                            change_pct = 0.0
-                    else:
-                        change_pct = 0.0
+                    close_val = quote["close"]
+                    open_val = quote["open"]
+                    high_val = quote["high"]
+                    low_val = quote["low"]
+                    volume_val = int(quote["volume"])
 
-                    # Skip NaN values
-                    if math.isnan(close_val):
-                        errors.append(f"{symbol}: NaN price")
-                        continue
+                    # Daily change percent (last close vs previous close)
+                    change_pct = round(quote["change_pct"], 2)
 
-                    stock_db.save_stock_data(
+                    pending.append(dict(
                         symbol=symbol,
                         name=symbol,  # Use symbol as name; enrichment comes later
                         price=close_val,
@@ -424,12 +547,15 @@ async def fetch_data(body: Optional[FetchRequest] = None):
                         low_price=low_val,
                         close_price=close_val,
                         last_fetched=fetch_time,
-                    )
-                    fetched_count += 1
+                    ))
 
                 except Exception as e:
                     errors.append(f"{symbol}: {str(e)}")
 
+        fetched_count = get_db().save_stock_data_many(pending) if pending else 0
+        if pending and not fetched_count:
+            errors.append("Failed to save fetched data to the database")
+
         return {
             "success": True,
             "fetched": fetched_count,
@@ -440,10 +566,65 @@ async def fetch_data(body: Optional[FetchRequest] = None):
         }
 
     except Exception as e:
-        print(f"Fetch failed: {e}")
+        log.exception("Fetch failed")
         return {"success": False, "error": str(e)}
 
 
+def _screen_one(stock: dict, history: dict | None, screen_strategy, comparison_strategies: list,
+                filter_conditions_list: list[list[tuple]], filter_operator: str,
+                indicators_needed: frozenset[str]) -> dict | None:
+    """Signals and filter evaluation for one stock; returns None if the filters reject it.
+
+    history is the stock's columnar history (shared across signal and filter
+    evaluation), or None when the screen needs none. Runs on a screen_pool worker.
+    """
+    sym = stock["symbol"]
+
+    history_len = len(history["date"]) if history else 0
+
+    # Primary signal
+    if screen_strategy is not None and history_len >= 2:
+        df = pd.DataFrame(history)
+        try:
+            stock["signal"] = screen_strategy.compute_intensity(df)
+        except Exception:
+            stock["signal"] = compute_signal(stock)
+    else:
+        stock["signal"] = compute_signal(stock)
+
+    # Per-strategy comparison signals
+    if comparison_strategies and history_len >= 2:
+        df = pd.DataFrame(history)
+        signals: dict[str, str] = {}
+        for cs in comparison_strategies:
+            try:
+                signals[cs.name] = cs.compute_intensity(df)
+            except Exception:
+                signals[cs.name] = "NEUTRAL"
+        stock["signals"] = signals
+    else:
+        stock["signals"] = {}
+
+    stock["yoy_growth"] = None
+
+    # Apply filters
+    if filter_conditions_list:
+        # Indicators are computed once per symbol (and reused while its
+        # history is unchanged), then checked against every filter
+        values = get_indicator_values(sym, history, indicators_needed) if history else None
+        results_per_filter = []
+        for compiled in filter_conditions_list:
+            results_per_filter.append(evaluate_compiled(values, compiled))
+        if filter_operator.upper() == "OR":
+            passes = any(results_per_filter)
+        else:
+            passes = all(results_per_filter)
+        if not passes:
+            return None
+
+    return stock
+
+
 @app.post("/api/screen")
 async def screen_stocks(body: Optional[ScreenRequest] = None):
     """
@@ -455,17 +636,17 @@ async def screen_stocks(body: Optional[ScreenRequest] = None):
         # Resolve symbols from body
         if body and body.symbols:
             symbols = [s.upper() for s in body.symbols]
-            stocks = stock_db.get_stocks_by_symbols(symbols)
+            stocks = get_db().get_stocks_by_symbols(symbols)
         elif body and body.portfolio_id:
-            symbols = stock_db.get_portfolio_symbols(body.portfolio_id)
+            symbols = get_db().get_portfolio_symbols(body.portfolio_id)
             if symbols:
-                stocks = stock_db.get_stocks_by_symbols(symbols)
+                stocks = get_db().get_stocks_by_symbols(symbols)
             else:
                 stocks = []
         else:
-            stocks = stock_db.get_all_stocks()
+            stocks = get_db().get_all_stocks()
 
-        data_source = stock_db.get_setting("data_source") or "yahoo_finance"
+        data_source = get_db().get_setting("data_source") or "yahoo_finance"
         if data_source == "yahoo_finance":
             source_label = "Yahoo Finance (yfinance)"
         elif data_source == "moomoo_opend":
@@ -497,67 +678,38 @@ async def screen_stocks(body: Optional[ScreenRequest] = None):
                 filter_names = [body.filter]
         filter_operator = (body.filter_operator if body else "AND") or "AND"
 
-        # Resolve filter conditions and compute per-filter tags
-        filter_conditions_list: list[list[dict]] = []
+        # Resolve filter conditions (compiled once at registration) and compute per-filter tags
+        filter_conditions_list: list[list[tuple]] = []
         all_filter_tags: list[str] = []
+        indicators_needed: frozenset[str] = frozenset()  # only these are computed per symbol
         for fname in filter_names:
             f = filter_registry.get(fname)
             if f:
                 conds = f.get("conditions", [])
-                filter_conditions_list.append(conds)
+                filter_conditions_list.append(filter_registry.get_compiled(fname))
+                indicators_needed |= required_indicators(conds)
                 tags = [condition_label(c) for c in conds]
                 all_filter_tags.extend(tags)
 
-        results = []
-        for stock in stocks:
-            sym = stock["symbol"]
-
-            # Load history once per stock (shared across signal + filter evaluation)
-            history = None
-            need_history = screen_strategy is not None or comparison_strategies or filter_conditions_list
-            if need_history:
-                history = stock_db.get_stock_history(sym)
-
-            # Primary signal
-            if screen_strategy is not None and history and len(history) >= 2:
-                df = pd.DataFrame(history)
-                try:
-                    stock["signal"] = screen_strategy.compute_intensity(df)
-                except Exception:
-                    stock["signal"] = compute_signal(stock)
-            else:
-                stock["signal"] = compute_signal(stock)
-
-            # Per-strategy comparison signals
-            if comparison_strategies and history and len(history) >= 2:
-                df = pd.DataFrame(history)
-                signals: dict[str, str] = {}
-                for cs in comparison_strategies:
-                    try:
-                        signals[cs.name] = cs.compute_intensity(df)
-                    except Exception:
-                        signals[cs.name] = "NEUTRAL"
-                stock["signals"] = signals
-            else:
-                stock["signals"] = {}
-
-            stock["yoy_growth"] = None
-
-            # Apply filters
-            if filter_conditions_list:
-                results_per_filter = []
-                for conds in filter_conditions_list:
-                    results_per_filter.append(evaluate_filter(history or [], conds))
-                if filter_operator.upper() == "OR":
-                    passes = any(results_per_filter)
-                else:
-                    passes = all(results_per_filter)
-                if not passes:
-                    continue
-
-            results.append(stock)
+        # All histories come from one query (on a worker, off the event loop)
+        loop = asyncio.get_running_loop()
+        histories: dict[str, dict] = {}
+        if screen_strategy is not None or comparison_strategies or filter_conditions_list:
+            histories = await loop.run_in_executor(
+                app.state.screen_pool, get_db().get_histories_columns, [stock["symbol"] for stock in stocks]
+            )
 
-        return {
+        # Symbols are independent: evaluate them in parallel on the worker
+        # pool, keeping the input order
+        screened = await asyncio.gather(*(
+            loop.run_in_executor(app.state.screen_pool, _screen_one, stock, histories.get(stock["symbol"]),
+                                 screen_strategy, comparison_strategies, filter_conditions_list,
+                                 filter_operator, indicators_needed)
+            for stock in stocks
+        ))
+        results = [stock for stock in screened if stock is not None]
+
+        return _OrjsonResponse({
             "success": True,
             "data": results,
             "count": len(results),
@@ -566,30 +718,27 @@ async def screen_stocks(body: Optional[ScreenRequest] = None):
             "filter_operator": filter_operator,
             "filter_tags": all_filter_tags,
             "comparison_strategies": [cs.name for cs in comparison_strategies],
-        }
+        })
 
     except Exception as e:
-        print(f"Screen failed: {e}")
+        log.exception("Screen failed")
         return {"success": False, "error": str(e)}
 
 
 @app.get("/api/db-info")
 async def db_info():
     """Returns database metadata for the footer status bar."""
-    info = stock_db.get_db_info()
+    info = get_db().get_db_info()
     return {"success": True, **info}
 
 
-import re as _re
-
-
 def _is_cn_stock(symbol: str) -> bool:
     """Return True if symbol is a Chinese A-share (6-digit code, optional .SH/.SZ/.BJ suffix)."""
     s = symbol.strip().upper()
     if "." in s:
         parts = s.rsplit(".", 1)
-        return parts[-1] in ("SH", "SZ", "BJ") and bool(_re.match(r"^\d{6}$", parts[0]))
-    return bool(_re.match(r"^\d{6}$", s))
+        return parts[-1] in ("SH", "SZ", "BJ") and bool(re.match(r"^\d{6}$", parts[0]))
+    return bool(re.match(r"^\d{6}$", s))
 
 
 def _to_ts_code(symbol: str) -> str:
@@ -597,7 +746,7 @@ def _to_ts_code(symbol: str) -> str:
     s = symbol.strip().upper()
     if "." in s:
         return s  # already has exchange suffix
-    if _re.match(r"^\d{6}$", s):
+    if re.match(r"^\d{6}$", s):
         first = s[0]
         if first in ("6", "5"):
             return f"{s}.SH"
@@ -610,7 +759,7 @@ def _to_ts_code(symbol: str) -> str:
 
 def _get_missing_segments(symbol: str, want_start: str, want_end: str) -> list[tuple[str, str]]:
     """Return list of (start, end) date ranges not yet in cache for the given symbol."""
-    cache_min, cache_max = stock_db.get_history_min_max(symbol)
+    cache_min, cache_max = get_db().get_history_min_max(symbol)
     if not cache_min:
         return [(want_start, want_end)]
     segments = []
@@ -621,6 +770,75 @@ def _get_missing_segments(symbol: str, want_start: str, want_end: str) -> list[t
     return segments
 
 
+def _download_field(data: pd.DataFrame, field: str, symbols: list[str]) -> pd.DataFrame:
+    """One OHLCV field of a yf.download frame as a date x symbol frame."""
+    if len(symbols) == 1:
+        col = data[field]
+        return (col.iloc[:, 0] if isinstance(col, pd.DataFrame) else col).to_frame(symbols[0])
+    return data.xs(field, axis=1, level=1)
+
+
+def _last_valid_rows(arr: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Row index of the last and second-to-last non-NaN value in each column (-1 where missing)."""
+    rows = np.arange(arr.shape[0])[:, None]
+    valid = ~np.isnan(arr)
+    last_i = np.where(valid, rows, -1).max(axis=0)
+    prev_i = np.where(valid & (rows < last_i), rows, -1).max(axis=0)
+    return last_i, prev_i
+
+
+def _latest_quotes(data: pd.DataFrame, symbols: list[str]) -> dict[str, dict]:
+    """Latest open/high/low/close/volume and close-to-close change % for every symbol in a
+    yf.download frame, computed column-wise for all symbols at once.
+
+    Each field is its own last non-NaN value, as hist[field].dropna().iloc[-1] would give.
+    Symbols without any close are omitted; a field with no value at all is None.
+    change_pct is 0.0 with fewer than two closes or a zero previous close.
+    """
+    closes = _download_field(data, "Close", symbols)
+    arr = closes.to_numpy(dtype=float)
+    if arr.size == 0:
+        return {}
+
+    cols = np.arange(arr.shape[1])
+    last_i, prev_i = _last_valid_rows(arr)
+    last = arr[last_i, cols]
+    prev = arr[prev_i, cols]
+    ok = (prev_i >= 0) & (prev != 0)
+    pct = np.zeros(arr.shape[1])
+    pct[ok] = (last[ok] - prev[ok]) / prev[ok] * 100
+
+    latest = {"close": last, "change_pct": pct}
+    for field in ("Open", "High", "Low", "Volume"):
+        values = _download_field(data, field, symbols).reindex(columns=closes.columns).to_numpy(dtype=float)
+        field_i, _ = _last_valid_rows(values)
+        latest[field.lower()] = np.where(field_i >= 0, values[field_i, cols], np.nan)
+
+    quotes = {}
+    for j, symbol in enumerate(closes.columns):
+        if last_i[j] < 0:
+            continue
+        quotes[symbol] = {k: (None if np.isnan(v[j]) else float(v[j])) for k, v in latest.items()}
+    return quotes
+
+
+def _ohlcv_records(dates: list[str], df: pd.DataFrame, columns: tuple[str, ...]) -> list[dict]:
+    """History row dicts from a downloaded frame, one column at a time instead of per-row Series.
+    columns names the open/high/low/close/volume columns; NaN prices become None, NaN volume 0."""
+    opens, highs, lows, closes, volumes = (df[c].to_numpy(dtype=float).tolist() for c in columns)
+    return [
+        {
+            "date": d,
+            "open": o if o == o else None,
+            "high": h if h == h else None,
+            "low": lo if lo == lo else None,
+            "close": c if c == c else None,
+            "volume": int(v) if v == v else 0,
+        }
+        for d, o, h, lo, c, v in zip(dates, opens, highs, lows, closes, volumes)
+    ]
+
+
 def _fetch_yfinance_history(symbol: str, period: str | None = None,
                              start_date: str | None = None, end_date: str | None = None) -> list[dict] | None:
     """Download OHLC history from yfinance and return as list of dicts. Returns None on failure."""
@@ -634,28 +852,46 @@ def _fetch_yfinance_history(symbol: str, period: str | None = None,
             return None
         if isinstance(df.columns, pd.MultiIndex):
             df.columns = df.columns.get_level_values(0)
-        rows = []
-        for idx, row in df.iterrows():
-            rows.append({
-                "date": idx.strftime("%Y-%m-%d"),
-                "open": float(row["Open"]) if pd.notna(row["Open"]) else None,
-                "high": float(row["High"]) if pd.notna(row["High"]) else None,
-                "low": float(row["Low"]) if pd.notna(row["Low"]) else None,
-                "close": float(row["Close"]) if pd.notna(row["Close"]) else None,
-                "volume": int(row["Volume"]) if pd.notna(row["Volume"]) else 0,
-            })
-        return rows
+        return _ohlcv_records(df.index.strftime("%Y-%m-%d").tolist(), df,
+                              ("Open", "High", "Low", "Close", "Volume"))
     except Exception as e:
-        print(f"yfinance history fetch failed for {symbol}: {e}")
+        log.warning("yfinance history fetch failed for %s: %s", symbol, e)
         return None
 
 
+def _fetch_yfinance_histories(symbols: list[str], start_date: str, end_date: str) -> dict[str, list[dict]]:
+    """Download one date range for several symbols with a single yf.download call.
+    Returns symbol -> history rows for the symbols that returned data; {} on failure."""
+    if len(symbols) == 1:
+        rows = _fetch_yfinance_history(symbols[0], start_date=start_date, end_date=end_date)
+        return {symbols[0]: rows} if rows else {}
+    try:
+        import yfinance as yf
+        data = yf.download(symbols, start=start_date, end=end_date, group_by="ticker",
+                           threads=True, progress=False)
+        histories = {}
+        tickers = set(data.columns.get_level_values(0))
+        for sym in symbols:
+            if sym not in tickers:
+                continue
+            # The frame spans every ticker's dates; drop the ones this symbol lacks
+            df = data[sym].dropna(how="all")
+            if df.empty:
+                continue
+            histories[sym] = _ohlcv_records(df.index.strftime("%Y-%m-%d").tolist(), df,
+                                            ("Open", "High", "Low", "Close", "Volume"))
+        return histories
+    except Exception as e:
+        log.warning("yfinance history fetch failed for %s: %s", ", ".join(symbols), e)
+        return {}
+
+
 def _fetch_tushare_history(symbol: str, start_date: str | None = None,
                             end_date: str | None = None) -> list[dict] | None:
     """Download OHLC history from Tushare and return as list of dicts. Returns None on failure."""
     try:
         import tushare as ts
-        api_key = stock_db.get_setting("tushare_api_key")
+        api_key = get_db().get_setting("tushare_api_key")
         if not api_key:
             return None
         pro = ts.pro_api(api_key)
@@ -673,20 +909,11 @@ def _fetch_tushare_history(symbol: str, start_date: str | None = None,
         if df is None or df.empty:
             return None
         df = df.sort_values("trade_date", ascending=True)
-        rows = []
-        for _, row in df.iterrows():
-            d = str(row["trade_date"])
-            rows.append({
-                "date": f"{d[:4]}-{d[4:6]}-{d[6:]}",
-                "open": float(row["open"]) if pd.notna(row["open"]) else None,
-                "high": float(row["high"]) if pd.notna(row["high"]) else None,
-                "low": float(row["low"]) if pd.notna(row["low"]) else None,
-                "close": float(row["close"]) if pd.notna(row["close"]) else None,
-                "volume": int(row["vol"]) if pd.notna(row["vol"]) else 0,
-            })
+        dates = [f"{d[:4]}-{d[4:6]}-{d[6:]}" for d in df["trade_date"].astype(str).tolist()]
+        rows = _ohlcv_records(dates, df, ("open", "high", "low", "close", "vol"))
         return rows if rows else None
     except Exception as e:
-        print(f"Tushare history fetch failed for {symbol}: {e}")
+        log.warning("Tushare history fetch failed for %s: %s", symbol, e)
         return None
 
 
@@ -694,7 +921,7 @@ def _fetch_tushare_income(symbol: str, start_date: str, end_date: str) -> list[d
     """Fetch quarterly income statements from Tushare for a CN A-share. Returns list of dicts."""
     try:
         import tushare as ts
-        api_key = stock_db.get_setting("tushare_api_key")
+        api_key = get_db().get_setting("tushare_api_key")
         if not api_key:
             return None
         pro = ts.pro_api(api_key)
@@ -734,7 +961,7 @@ def _fetch_tushare_income(symbol: str, start_date: str, end_date: str) -> list[d
             })
         return rows if rows else None
     except Exception as e:
-        print(f"Tushare income fetch failed for {symbol}: {e}")
+        log.warning("Tushare income fetch failed for %s: %s", symbol, e)
         return None
 
 
@@ -801,7 +1028,7 @@ def _fetch_binance_history(symbol: str, start_date: str | None = None,
 
         return all_rows if all_rows else None
     except Exception as e:
-        print(f"Binance history fetch failed for {symbol}: {e}")
+        log.warning("Binance history fetch failed for %s: %s", symbol, e)
         return None
 
 
@@ -817,7 +1044,7 @@ def _get_binance_24hr_ticker(symbol: str) -> dict | None:
         resp.raise_for_status()
         return resp.json()
     except Exception as e:
-        print(f"Binance 24hr ticker failed for {symbol}: {e}")
+        log.warning("Binance 24hr ticker failed for %s: %s", symbol, e)
         return None
 
 
@@ -838,10 +1065,6 @@ def _validate_binance_keys(api_key: str, api_secret: str) -> dict:
             }
 
         # Signed account endpoint requires HMAC-SHA256 signature
-        import hmac
-        import hashlib
-        import time
-
         ts = int(time.time() * 1000)
         query = f"timestamp={ts}"
         sig = hmac.new(api_secret.encode(), query.encode(), hashlib.sha256).hexdigest()
@@ -925,9 +1148,13 @@ def _build_financials_summary(statements: list[dict]) -> dict:
     }
 
 
+def _time_values(dates: list[str], series: pd.Series, digits: int) -> list[dict]:
+    """[{time, value}] points for the non-NaN entries of an indicator series aligned with dates."""
+    return [{"time": t, "value": round(v, digits)} for t, v in zip(dates, series.tolist()) if v == v]
+
+
 def _build_detail_response(symbol: str, history_rows: list[dict], from_cache: bool) -> dict:
     """Build the full detail response from history rows using local indicator calculations."""
-    from strategies.indicators import sma, rsi as rsi_fn, macd as macd_fn, bollinger_bands
 
     ohlc = []
     volume_data = []
@@ -945,43 +1172,31 @@ def _build_detail_response(symbol: str, history_rows: list[dict], from_cache: bo
 
     close_series = pd.Series(closes_list)
 
-    # Moving Averages
-    ma50_raw = sma(close_series, 50)
-    ma100_raw = sma(close_series, 100)
-    ma50 = [{"time": dates_list[i], "value": round(float(ma50_raw.iloc[i]), 2)}
-            for i in range(len(dates_list)) if pd.notna(ma50_raw.iloc[i])]
-    ma100 = [{"time": dates_list[i], "value": round(float(ma100_raw.iloc[i]), 2)}
-             for i in range(len(dates_list)) if pd.notna(ma100_raw.iloc[i])]
+    # Moving Averages (rolling means); series are read back once as plain
+    # lists instead of one .iloc lookup per bar. NaN != NaN skips warm-up bars.
+    ma50 = _time_values(dates_list, sma(close_series, 50), 2)
+    ma100 = _time_values(dates_list, sma(close_series, 100), 2)
 
     # RSI
     rsi_series = rsi_fn(close_series, 14)
-    rsi_data = [{"time": dates_list[i], "value": round(float(rsi_series.iloc[i]), 2)}
-                for i in range(len(dates_list)) if pd.notna(rsi_series.iloc[i])]
-    current_rsi = round(float(rsi_series.dropna().iloc[-1]), 2) if not rsi_series.dropna().empty else None
+    rsi_data = _time_values(dates_list, rsi_series, 2)
+    current_rsi = rsi_data[-1]["value"] if rsi_data else None
 
     # MACD
     macd_line, signal_line, histogram = macd_fn(close_series)
-    macd_data = []
-    for i in range(len(dates_list)):
-        if pd.notna(macd_line.iloc[i]) and pd.notna(signal_line.iloc[i]):
-            macd_data.append({
-                "time": dates_list[i],
-                "macd": round(float(macd_line.iloc[i]), 4),
-                "signal": round(float(signal_line.iloc[i]), 4),
-                "histogram": round(float(histogram.iloc[i]), 4),
-            })
+    macd_data = [
+        {"time": t, "macd": round(m, 4), "signal": round(sg, 4), "histogram": round(h, 4)}
+        for t, m, sg, h in zip(dates_list, macd_line.tolist(), signal_line.tolist(), histogram.tolist())
+        if m == m and sg == sg
+    ]
 
     # Bollinger Bands
     bb_upper, bb_middle, bb_lower = bollinger_bands(close_series, 20)
-    bb_data = []
-    for i in range(len(dates_list)):
-        if pd.notna(bb_upper.iloc[i]):
-            bb_data.append({
-                "time": dates_list[i],
-                "upper": round(float(bb_upper.iloc[i]), 2),
-                "middle": round(float(bb_middle.iloc[i]), 2),
-                "lower": round(float(bb_lower.iloc[i]), 2),
-            })
+    bb_data = [
+        {"time": t, "upper": round(u, 2), "middle": round(m, 2), "lower": round(lo, 2)}
+        for t, u, m, lo in zip(dates_list, bb_upper.tolist(), bb_middle.tolist(), bb_lower.tolist())
+        if u == u
+    ]
 
     # 52-week high/low from cached data
     cached_high = max(closes_list) if closes_list else None
@@ -1003,8 +1218,64 @@ def _build_detail_response(symbol: str, history_rows: list[dict], from_cache: bo
     }
 
 
+# Built detail payloads (LRU). Filled from worker threads, hence the lock.
+_DETAIL_CACHE_SIZE = 256
+_detail_cache: OrderedDict[tuple, dict] = OrderedDict()
+_detail_cache_lock = threading.Lock()
+
+
+def _detail_revision(symbol: str, history_rows: list[dict], from_cache: bool) -> tuple:
+    """Revision key of a detail payload: the last date, row count and last close
+    (as for the screener's indicator cache), so a refreshed latest bar rebuilds."""
+    last = history_rows[-1]
+    return (symbol, last["date"], len(history_rows), last["close"], from_cache)
+
+
+def _cached_detail_response(symbol: str, history_rows: list[dict], from_cache: bool) -> dict:
+    """_build_detail_response, memoized per symbol and history revision. Blocking."""
+    key = _detail_revision(symbol, history_rows, from_cache)
+    with _detail_cache_lock:
+        if key in _detail_cache:
+            _detail_cache.move_to_end(key)
+            return _detail_cache[key]
+    detail = _build_detail_response(symbol, history_rows, from_cache)
+    with _detail_cache_lock:
+        _detail_cache[key] = detail
+        if len(_detail_cache) > _DETAIL_CACHE_SIZE:
+            _detail_cache.popitem(last=False)
+    return detail
+
+
+def _detail_etag(revision: tuple, info: Optional[dict], company_name: str) -> str:
+    """ETag of a detail response, from everything it is built from: the history
+    revision plus the fundamentals snapshot (realtime) or cached company name."""
+    inputs = orjson.dumps([list(revision), info, company_name], option=orjson.OPT_SORT_KEYS, default=str)
+    return f'"{hashlib.blake2b(inputs, digest_size=16).hexdigest()}"'
+
+
+# Ticker.info keys used by the detail and financials endpoints
+_FUNDAMENTAL_KEYS = (
+    "shortName", "sector", "trailingPE", "marketCap", "fiftyTwoWeekHigh", "fiftyTwoWeekLow",
+    "earningsTimestamp", "totalRevenue", "revenueGrowth", "grossMargins", "operatingMargins",
+)
+
+
+def _ticker_info(symbol: str) -> dict:
+    """yfinance Ticker.info fundamentals for symbol, served from the SQLite cache while under 24h old.
+    Blocking; raises if the yfinance lookup fails."""
+    cached = get_db().get_fundamentals(symbol)
+    if cached is not None:
+        return cached
+    import yfinance as yf
+    info = yf.Ticker(symbol).info or {}
+    snapshot = {k: info.get(k) for k in _FUNDAMENTAL_KEYS}
+    if any(v is not None for v in snapshot.values()):
+        get_db().save_fundamentals(symbol, snapshot)
+    return snapshot
+
+
 @app.get("/api/stock/{symbol}/detail")
-async def stock_detail(symbol: str, realtime: bool = False):
+async def stock_detail(request: Request, symbol: str, realtime: bool = False):
     """
     Returns chart data (OHLC + 50MA/100MA + RSI + MACD + Bollinger) and fundamentals.
 
@@ -1012,13 +1283,10 @@ async def stock_detail(symbol: str, realtime: bool = False):
     - If realtime=False (default): serve from cached history immediately; never call yfinance for OHLC.
     - If realtime=True: attempt fresh yfinance download, save to cache, fall back to cache on failure.
     - Fundamentals (PE, market cap, etc.) are always attempted from yfinance but use cached fallbacks.
+    Responses carry an ETag; a matching If-None-Match gets an empty 304.
     """
     try:
-        from datetime import datetime
-
         symbol = symbol.upper()
-        cached_rows = stock_db.get_stock_history(symbol)
-        has_cache = bool(cached_rows)
         history_rows = None
         from_cache = False
 
@@ -1027,28 +1295,45 @@ async def stock_detail(symbol: str, realtime: bool = False):
             g_start, g_end = _get_global_date_range()
             fetch_start = g_start or (date.today() - timedelta(days=365)).isoformat()
             fetch_end = g_end or date.today().isoformat()
-            # Incremental fetch: only downloads missing segments
-            ensure_history(symbol, fetch_start, fetch_end)
-            history_rows = (
-                stock_db.get_stock_history_range(symbol, fetch_start, fetch_end)
-                or stock_db.get_stock_history(symbol)
-            )
+            # Incremental fetch: only downloads missing segments (in a worker thread)
+            await asyncio.to_thread(ensure_history, symbol, fetch_start, fetch_end)
+            history_rows = await asyncio.to_thread(get_db().get_stock_history_range, symbol, fetch_start, fetch_end)
+            if not history_rows:
+                history_rows = await asyncio.to_thread(get_db().get_stock_history, symbol)
             from_cache = bool(history_rows)
             if not history_rows:
                 return {"success": False, "error": f"No data for {symbol}. Enable Realtime Fetch and click Fetch & Run first."}
         else:
-            if has_cache:
-                history_rows = cached_rows
+            history_rows = await asyncio.to_thread(get_db().get_stock_history, symbol)
+            if history_rows:
                 from_cache = True
             else:
                 return {"success": False, "error": f"No cached data for {symbol}. Enable Realtime Fetch and click Fetch & Run first."}
 
+        # Fundamentals inputs: only call yfinance when realtime=True to avoid rate limits
+        info = None
+        company_name = symbol
+        if realtime and (get_db().get_setting("data_source") or "yahoo_finance") != "tushare":
+            try:
+                info = await asyncio.to_thread(_ticker_info, symbol)
+            except Exception as e:
+                log.warning("Fundamentals fetch failed for %s (using cached fallback): %s", symbol, e)
+        else:
+            # Use cached stock data for company name and price-derived fields
+            cached_stock = await asyncio.to_thread(get_db().get_stocks_by_symbols, [symbol])
+            if cached_stock:
+                company_name = cached_stock[0].get("name") or symbol
+
+        # Revalidation is decided from the inputs alone, before anything is built
+        etag = _detail_etag(_detail_revision(symbol, history_rows, from_cache), info, company_name)
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+
         # Build OHLC + local indicator response
-        detail = _build_detail_response(symbol, history_rows, from_cache)
+        detail = await asyncio.to_thread(_cached_detail_response, symbol, history_rows, from_cache)
         if not detail.get("success", True):
             return detail
 
-        # Fundamentals: only call yfinance when realtime=True to avoid rate limits
         fundamentals = {
             "pe_ratio": None,
             "market_cap": None,
@@ -1057,12 +1342,8 @@ async def stock_detail(symbol: str, realtime: bool = False):
             "fifty_two_week_high": detail["cached_52w_high"],
             "fifty_two_week_low": detail["cached_52w_low"],
         }
-        company_name = symbol
-        if realtime and (stock_db.get_setting("data_source") or "yahoo_finance") != "tushare":
+        if info is not None:
             try:
-                import yfinance as yf
-                ticker = yf.Ticker(symbol)
-                info = ticker.info or {}
                 fundamentals["pe_ratio"] = info.get("trailingPE")
                 fundamentals["market_cap"] = info.get("marketCap")
                 fundamentals["sector"] = info.get("sector")
@@ -1077,14 +1358,9 @@ async def stock_detail(symbol: str, realtime: bool = False):
                 if ed:
                     fundamentals["earnings_date"] = datetime.fromtimestamp(ed).strftime("%Y-%m-%d")
             except Exception as e:
-                print(f"Fundamentals fetch failed for {symbol} (using cached fallback): {e}")
-        else:
-            # Use cached stock data for company name and price-derived fields
-            cached_stock = stock_db.get_stocks_by_symbols([symbol])
-            if cached_stock:
-                company_name = cached_stock[0].get("name") or symbol
+                log.warning("Fundamentals fetch failed for %s (using cached fallback): %s", symbol, e)
 
-        return {
+        response = _OrjsonResponse({
             "success": True,
             "symbol": symbol,
             "company_name": company_name,
@@ -1099,13 +1375,27 @@ async def stock_detail(symbol: str, realtime: bool = False):
             "macd": detail["macd"],
             "bollinger": detail["bollinger"],
             "fundamentals": fundamentals,
-        }
+        })
+        response.headers["ETag"] = etag
+        return response
 
     except Exception as e:
-        print(f"Detail endpoint failed for {symbol}: {e}")
+        log.exception("Detail endpoint failed for %s", symbol)
         return {"success": False, "error": str(e)}
 
 
+@app.get("/api/stock/{symbol}/history")
+async def stock_history(symbol: str, start_date: Optional[str] = None, end_date: Optional[str] = None):
+    """Returns cached daily OHLCV rows as a JSON array (date ASC), serialized directly by SQLite.
+    Optional start_date/end_date (YYYY-MM-DD, inclusive) limit the range read."""
+    symbol = symbol.upper()
+    payload = get_db().get_stock_history_json(symbol, start_date, end_date)
+    if payload is None:
+        return {"success": False, "error": f"Failed to read history for {symbol}"}
+
+    return Response(content=payload, media_type="application/json")
+
+
 @app.get("/api/stock/{symbol}/financials")
 async def stock_financials(
     symbol: str,
@@ -1119,7 +1409,6 @@ async def stock_financials(
     - US stocks: returns yfinance fundamentals snapshot (PE, market cap, margins, etc.)
     """
     try:
-        from datetime import datetime as _dt
         symbol = symbol.upper()
         is_cn = _is_cn_stock(symbol)
 
@@ -1128,8 +1417,7 @@ async def stock_financials(
             yf_data: dict = {}
             if realtime:
                 try:
-                    import yfinance as yf
-                    info = yf.Ticker(symbol).info or {}
+                    info = await asyncio.to_thread(_ticker_info, symbol)
                     yf_data = {
                         "short_name": info.get("shortName"),
                         "sector": info.get("sector"),
@@ -1141,7 +1429,7 @@ async def stock_financials(
                         "operating_margins": info.get("operatingMargins"),
                     }
                 except Exception as e:
-                    print(f"yfinance fundamentals failed for {symbol}: {e}")
+                    log.warning("yfinance fundamentals failed for %s: %s", symbol, e)
             return {
                 "success": True,
                 "symbol": symbol,
@@ -1151,10 +1439,10 @@ async def stock_financials(
             }
 
         # CN stock: use Tushare income data
-        data_source = stock_db.get_setting("data_source") or "yahoo_finance"
+        data_source = get_db().get_setting("data_source") or "yahoo_finance"
         if data_source != "tushare":
             # Check if we have any cached data regardless of source setting
-            cached = stock_db.get_financial_statements(symbol)
+            cached = get_db().get_financial_statements(symbol)
             if not cached:
                 return {
                     "success": False,
@@ -1169,12 +1457,12 @@ async def stock_financials(
         ts_end = resolved_end.replace("-", "")
 
         from_cache = True
-        if realtime and not stock_db.has_fresh_financials(symbol):
+        if realtime and not get_db().has_fresh_financials(symbol):
             rows = _fetch_tushare_income(symbol, ts_start, ts_end)
             if rows:
-                stock_db.save_financial_statements(symbol, rows)
+                get_db().save_financial_statements(symbol, rows)
                 from_cache = False
-            elif not stock_db.get_financial_statements(symbol):
+            elif not get_db().get_financial_statements(symbol):
                 # Detect quota errors (already printed in _fetch_tushare_income)
                 return {
                     "success": False,
@@ -1185,7 +1473,7 @@ async def stock_financials(
                     "statements": [],
                 }
 
-        statements = stock_db.get_financial_statements(symbol, ts_start, ts_end)
+        statements = get_db().get_financial_statements(symbol, ts_start, ts_end)
         if not statements:
             if not realtime:
                 return {
@@ -1215,7 +1503,7 @@ async def stock_financials(
         }
 
     except Exception as e:
-        print(f"Financials endpoint failed for {symbol}: {e}")
+        log.exception("Financials endpoint failed for %s", symbol)
         return {"success": False, "error": str(e), "statements": []}
 
 
@@ -1233,12 +1521,10 @@ async def precache_history(body: Optional[PrecacheRequest] = None):
     Call this after /api/fetch to populate chart history without clicking each stock.
     """
     try:
-        import asyncio
-
         if body and body.symbols:
             symbols = [s.upper() for s in body.symbols]
         elif body and body.portfolio_id:
-            symbols = stock_db.get_portfolio_symbols(body.portfolio_id)
+            symbols = get_db().get_portfolio_symbols(body.portfolio_id)
             if not symbols:
                 return {"success": False, "error": "Portfolio not found or has no symbols"}
         else:
@@ -1255,23 +1541,33 @@ async def precache_history(body: Optional[PrecacheRequest] = None):
         skipped = 0
         errors = []
 
-        # Process in batches of 5 to avoid rate limits
-        batch_size = 5
+        # Process in batches of 20 (one multi-ticker download per missing
+        # date segment) to stay under Yahoo's rate and URL-length limits
+        batch_size = 20
         for batch_start in range(0, len(symbols), batch_size):
             batch = symbols[batch_start:batch_start + batch_size]
+            to_fetch = []
             for sym in batch:
-                try:
-                    # Skip if cache already fully covers the requested range
-                    if stock_db.has_history_coverage(sym, fetch_start, fetch_end):
-                        skipped += 1
-                        continue
-                    ok = ensure_history(sym, fetch_start, fetch_end)
-                    if ok:
-                        cached += 1
-                    else:
-                        errors.append(f"{sym}: no data returned")
-                except Exception as e:
-                    errors.append(f"{sym}: {str(e)}")
+                # Skip if cache already fully covers the requested range
+                if get_db().has_history_coverage(sym, fetch_start, fetch_end):
+                    skipped += 1
+                else:
+                    to_fetch.append(sym)
+            pending: dict[str, list[list[dict]]] = {}  # saved together in one transaction per batch
+            try:
+                if to_fetch:
+                    pending = await asyncio.to_thread(_fetch_missing_histories, to_fetch, fetch_start, fetch_end)
+            except Exception as e:
+                errors.extend(f"{sym}: {str(e)}" for sym in to_fetch)
+            else:
+                errors.extend(f"{sym}: no data returned" for sym in to_fetch if sym not in pending)
+            if pending:
+                if get_db().save_many_histories(
+                    (sym, rows) for sym, segments in pending.items() for rows in segments
+                ):
+                    cached += len(pending)
+                else:
+                    errors.extend(f"{sym}: failed to save history" for sym in pending)
             # Small delay between batches to be gentle on rate limits
             if batch_start + batch_size < len(symbols):
                 await asyncio.sleep(0.5)
@@ -1285,7 +1581,7 @@ async def precache_history(body: Optional[PrecacheRequest] = None):
             "error_details": errors[:10],
         }
     except Exception as e:
-        print(f"Precache failed: {e}")
+        log.exception("Precache failed")
         return {"success": False, "error": str(e)}
 
 
@@ -1294,7 +1590,7 @@ async def stock_signal_details(symbol: str, strategy_name: str = ""):
     """Returns signal calculation details for a symbol, useful for hover tooltips."""
     try:
         symbol = symbol.upper()
-        history = stock_db.get_stock_history(symbol)
+        history = get_db().get_stock_history_columns(symbol)
         if not history:
             return {"success": False, "error": f"No history for {symbol}"}
 
@@ -1307,7 +1603,6 @@ async def stock_signal_details(symbol: str, strategy_name: str = ""):
         if strategy is not None:
             # Strategy-specific details
             if strategy_name == "RSI Mean Reversion":
-                from strategies.indicators import rsi as rsi_fn
                 rsi_vals = rsi_fn(df["close"], 14).dropna()
                 current_rsi = round(float(rsi_vals.iloc[-1]), 2) if not rsi_vals.empty else None
                 details["rsi"] = current_rsi
@@ -1315,9 +1610,8 @@ async def stock_signal_details(symbol: str, strategy_name: str = ""):
                 details["signal"] = strategy.compute_intensity(df)
 
             elif strategy_name == "Golden Cross":
-                from strategies.indicators import sma as sma_fn
-                fast = sma_fn(df["close"], 50).dropna()
-                slow = sma_fn(df["close"], 100).dropna()
+                fast = sma(df["close"], 50).dropna()
+                slow = sma(df["close"], 100).dropna()
                 f = round(float(fast.iloc[-1]), 2) if not fast.empty else None
                 s = round(float(slow.iloc[-1]), 2) if not slow.empty else None
                 details["ma50"] = f
@@ -1326,7 +1620,6 @@ async def stock_signal_details(symbol: str, strategy_name: str = ""):
                 details["signal"] = strategy.compute_intensity(df)
 
             elif strategy_name == "Price Change Momentum":
-                from strategies.indicators import daily_change_pct as dcp_fn
                 chg = dcp_fn(df["close"]).dropna()
                 val = round(float(chg.iloc[-1]), 2) if not chg.empty else None
                 details["daily_change_pct"] = val
@@ -1336,11 +1629,10 @@ async def stock_signal_details(symbol: str, strategy_name: str = ""):
                 details["signal"] = strategy.compute_intensity(df)
         else:
             # Default: use change_percent from cached stock data
-            stock = stock_db.get_stocks_by_symbols([symbol])
+            stock = get_db().get_stocks_by_symbols([symbol])
             chg = stock[0]["change_percent"] if stock else 0
             details["daily_change_pct"] = chg
             details["thresholds"] = {"strong_buy": 2.0, "buy": 0.5, "sell": -0.5, "strong_sell": -2.0}
-            from strategies.indicators import daily_change_pct as dcp_fn
             chg_series = dcp_fn(df["close"]).dropna()
             val = float(chg_series.iloc[-1]) if not chg_series.empty else 0
             if val > 2.0:
@@ -1363,25 +1655,30 @@ async def stock_signal_details(symbol: str, strategy_name: str = ""):
 async def export_csv():
     """Returns all cached stock data as CSV text."""
     try:
-        stocks = stock_db.get_all_stocks()
-        if not stocks:
+        # Rows come straight off a database cursor as the response is sent
+        stocks = get_db().iter_stocks()
+        first = next(stocks, None)
+        if first is None:
             return {"success": False, "error": "No data to export"}
 
-        import csv
-        import io
-
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(["Ticker", "Name", "Price", "Open", "High", "Low", "Close", "Volume", "Change %", "Last Fetched"])
-        for s in stocks:
-            writer.writerow([
-                s["symbol"], s["name"], s["price"], s["open"], s["high"],
-                s["low"], s["close"], s["volume"], s["change_percent"], s["last_fetched"],
-            ])
-
-        from fastapi.responses import Response
-        return Response(
-            content=output.getvalue(),
+        class _Echo:
+            """File-like sink: csv.writer's writerow returns the formatted line."""
+            def write(self, line):
+                return line
+
+        writer = csv.writer(_Echo())
+
+        def rows():
+            yield writer.writerow(["Ticker", "Name", "Price", "Open", "High", "Low", "Close", "Volume", "Change %", "Last Fetched"])
+            for s in itertools.chain((first,), stocks):
+                yield writer.writerow([
+                    s["symbol"], s["name"], s["price"], s["open"], s["high"],
+                    s["low"], s["close"], s["volume"], s["change_percent"], s["last_fetched"],
+                ])
+
+        # Streamed row by row instead of assembling the whole document first
+        return StreamingResponse(
+            rows(),
             media_type="text/csv",
             headers={"Content-Disposition": "attachment; filename=gravion_export.csv"},
         )
@@ -1424,14 +1721,13 @@ BUILTIN_STRATEGY_NAMES = {"Golden Cross", "RSI Mean Reversion", "Price Change Mo
 @app.get("/api/strategies")
 async def list_strategies():
     """Returns all registered strategies (built-in + user), with any saved custom params."""
-    import json as _json
     strategies = strategy_loader.list_all()
     for s in strategies:
         key = f"strategy_params_{s['name']}"
-        saved = stock_db.get_setting(key)
+        saved = get_db().get_setting(key)
         if saved:
             try:
-                s["saved_params"] = _json.loads(saved)
+                s["saved_params"] = json.loads(saved)
             except Exception:
                 pass
     return {"strategies": strategies}
@@ -1465,16 +1761,15 @@ async def optimize_backtest(symbol: str, body: OptimizeRequest):
     Returns results sorted by total_return_pct descending.
     """
     try:
-        import itertools
         symbol = symbol.upper()
 
         start_date, end_date = resolve_date_range(body.start_date, body.end_date, body.period)
         if body.realtime:
             await asyncio.sleep(0.25)
-            ensure_history(symbol, start_date, end_date)
-        history = stock_db.get_stock_history_range(symbol, start_date, end_date)
+            await asyncio.to_thread(ensure_history, symbol, start_date, end_date)
+        history = get_db().get_stock_history_columns(symbol, start_date, end_date)
         if not history:
-            history = stock_db.get_stock_history(symbol) or []
+            history = get_db().get_stock_history_columns(symbol)
         if not history:
             hint = "" if body.realtime else " (enable Realtime to fetch fresh data)"
             return {"success": False, "error": f"No historical data for {symbol}{hint}"}
@@ -1491,7 +1786,9 @@ async def optimize_backtest(symbol: str, body: OptimizeRequest):
             if strategy is None:
                 continue
             try:
-                result = run_backtest(strategy, df, initial_capital=body.initial_capital)
+                result = await asyncio.to_thread(
+                    run_backtest, strategy, df, initial_capital=body.initial_capital
+                )
                 results.append({
                     "params": params,
                     "total_return_pct": result.total_return_pct,
@@ -1515,7 +1812,7 @@ async def optimize_backtest(symbol: str, body: OptimizeRequest):
         }
 
     except Exception as e:
-        print(f"Optimize failed for {symbol}: {e}")
+        log.exception("Optimize failed for %s", symbol)
         return {"success": False, "error": str(e)}
 
 
@@ -1560,125 +1857,269 @@ async def delete_filter(name: str):
     return {"success": False, "error": f"Filter '{name}' not found"}
 
 
-@app.post("/api/backtest/batch")
-async def batch_backtest(body: BatchBacktestRequest):
-    """Run a backtest across multiple symbols and return aggregated results."""
-    try:
-        # Resolve strategy
-        if body.strategy_name:
-            if body.params:
-                strategy = strategy_loader.instantiate_with_params(body.strategy_name, body.params)
-            else:
-                strategy = strategy_loader.get(body.strategy_name)
-            if not strategy:
-                return {"success": False, "error": f"Strategy '{body.strategy_name}' not found"}
-        elif body.strategy_json:
-            strategy = JsonStrategy(body.strategy_json)
+
+
+def _prefetch_histories(symbols: list[str], start_date: str, end_date: str) -> dict[str, bool | Exception]:
+    """ensure_history for each symbol on the prefetch pool.
+    Returns symbol -> ensure_history result, or the exception it raised."""
+    pool = app.state.prefetch_pool
+    fetched: dict[str, bool | Exception] = {}
+    futures = {pool.submit(ensure_history, sym, start_date, end_date): sym for sym in dict.fromkeys(symbols)}
+    for future in as_completed(futures):
+        try:
+            fetched[futures[future]] = future.result()
+        except Exception as e:
+            fetched[futures[future]] = e
+    return fetched
+
+
+def _resolve_batch(body: BatchBacktestRequest) -> tuple:
+    """The batch request's strategy and upper-cased symbol list.
+    Raises ValueError with a user-facing message when either is missing."""
+    if body.strategy_name:
+        if body.params:
+            strategy = strategy_loader.instantiate_with_params(body.strategy_name, body.params)
         else:
-            return {"success": False, "error": "Provide strategy_name or strategy_json"}
+            strategy = strategy_loader.get(body.strategy_name)
+        if not strategy:
+            raise ValueError(f"Strategy '{body.strategy_name}' not found")
+    elif body.strategy_json:
+        strategy = JsonStrategy(body.strategy_json)
+    else:
+        raise ValueError("Provide strategy_name or strategy_json")
+
+    symbols = body.symbols or []
+    if not symbols and body.portfolio_id:
+        symbols = get_db().get_portfolio_symbols(body.portfolio_id)
+    if not symbols:
+        raise ValueError("No symbols provided. Use symbols list or portfolio_id.")
+    return strategy, [sym.upper() for sym in symbols]
+
+
+async def _batch_jobs(body: BatchBacktestRequest, symbols: list[str],
+                      start_date: str, end_date: str) -> list[tuple[str, dict | str]]:
+    """Load each symbol's history for a batch backtest.
+    Returns (symbol, job) pairs in input order, where job is either a dict
+    holding the DataFrame and its metadata or an error message."""
+    # Realtime: fetch missing history for all symbols up front. The work is
+    # network-bound, so a small pool overlaps the round trips (bounded to
+    # stay under yfinance rate limits); backtests then run from the cache.
+    fetched_by_symbol: dict[str, bool | Exception] = {}
+    if body.realtime:
+        fetched_by_symbol = await asyncio.to_thread(
+            _prefetch_histories, symbols, start_date, end_date
+        )
 
-        # Resolve symbols
-        symbols = body.symbols or []
-        if not symbols and body.portfolio_id:
-            symbols = stock_db.get_portfolio_symbols(body.portfolio_id)
-        if not symbols:
-            return {"success": False, "error": "No symbols provided. Use symbols list or portfolio_id."}
+    # Reading history and building the frames is blocking SQLite and pandas
+    # work, so it runs on a screen-pool worker rather than the event loop
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        app.state.screen_pool, _load_batch_jobs, body.realtime, fetched_by_symbol,
+        symbols, start_date, end_date,
+    )
+
+
+def _load_batch_jobs(realtime: bool, fetched_by_symbol: dict[str, bool | Exception], symbols: list[str],
+                     start_date: str, end_date: str) -> list[tuple[str, dict | str]]:
+    """The blocking part of _batch_jobs: histories (the requested ranges for
+    all symbols in one query) and their DataFrames."""
+    histories = get_db().get_histories_columns(symbols, start_date, end_date)
+    jobs: list[tuple[str, dict | str]] = []
+    for sym in symbols:
+        try:
+            from_cache = True
 
-        import asyncio as _asyncio
+            if realtime:
+                fetched = fetched_by_symbol[sym]
+                if isinstance(fetched, Exception):
+                    raise fetched
+                from_cache = not fetched
+
+            # Try requested date range first
+            history = histories.get(sym)
+
+            # Fallback: use all cached history (ignoring date range)
+            if not history:
+                history = get_db().get_stock_history_columns(sym)
+                if history:
+                    from_cache = True  # definitely from cache
+
+            if not history:
+                hint = "" if realtime else " (enable Realtime to fetch fresh data)"
+                jobs.append((sym, f"No historical data available{hint}"))
+                continue
 
-        start_date, end_date = resolve_date_range(body.start_date, body.end_date, body.period)
+            jobs.append((sym, {
+                "df": pd.DataFrame(history),
+                "data_start": history["date"][0],
+                "data_end": history["date"][-1],
+                "from_cache": from_cache,
+            }))
+        except Exception as e:
+            jobs.append((sym, str(e)))
+    return jobs
 
-        results = []
-        errors = []
 
-        for i, sym in enumerate(symbols):
-            sym = sym.upper()
-            try:
-                from_cache = True
+# Picklability per strategy class (see _backtest_executor)
+_picklable_strategies: dict[type, bool] = {}
 
-                if body.realtime:
-                    # Throttle to avoid yfinance rate limits (250ms between requests)
-                    if i > 0:
-                        await _asyncio.sleep(0.25)
-                    fetched = ensure_history(sym, start_date, end_date)
-                    from_cache = not fetched
-
-                # Try requested date range first
-                history = stock_db.get_stock_history_range(sym, start_date, end_date)
-
-                # Fallback: use all cached history (ignoring date range)
-                if not history:
-                    history = stock_db.get_stock_history(sym)
-                    if history:
-                        from_cache = True  # definitely from cache
-
-                if not history:
-                    hint = "" if body.realtime else " (enable Realtime to fetch fresh data)"
-                    errors.append({"symbol": sym, "error": f"No historical data available{hint}"})
-                    continue
 
-                actual_start = history[0]["date"]
-                actual_end = history[-1]["date"]
+def _backtest_executor(strategy) -> ProcessPoolExecutor | None:
+    """Where a batch's backtests run. Symbols backtest independently, so they
+    spread across the process pool; strategies that cannot be pickled
+    (classes loaded from user files) run on the default thread pool instead.
+    Picklability follows from the class, so it is checked once per class."""
+    cls = type(strategy)
+    if cls not in _picklable_strategies:
+        try:
+            pickle.dumps(strategy)
+            _picklable_strategies[cls] = True
+        except Exception:
+            _picklable_strategies[cls] = False
+    return app.state.backtest_pool if _picklable_strategies[cls] else None
 
-                df = pd.DataFrame(history)
-                result = run_backtest(strategy, df, initial_capital=body.initial_capital_per_stock)
-                result.symbol = sym
 
-                results.append({
-                    "symbol": sym,
-                    "total_return_pct": result.total_return_pct,
-                    "win_rate_pct": result.win_rate_pct,
-                    "profit_factor": result.profit_factor,
-                    "max_drawdown_pct": result.max_drawdown_pct,
-                    "trade_count": len(result.trades),
-                    "trades": [
-                        {"date": t.date, "type": t.type, "price": t.price, "shares": t.shares, "pnl": t.pnl}
-                        for t in result.trades
-                    ],
-                    "equity_curve": result.equity_curve,
-                    "data_start": actual_start,
-                    "data_end": actual_end,
-                    "from_cache": from_cache,
-                })
-            except Exception as e:
-                errors.append({"symbol": sym, "error": str(e)})
-
-        # Aggregate summary
-        if results:
-            total_return = sum(r["total_return_pct"] for r in results) / len(results)
-            avg_win_rate = sum(r["win_rate_pct"] for r in results) / len(results)
-            total_trades = sum(r["trade_count"] for r in results)
-            best = max(results, key=lambda r: r["total_return_pct"])
-            worst = min(results, key=lambda r: r["total_return_pct"])
-            summary = {
-                "portfolio_return_pct": round(total_return, 2),
-                "avg_win_rate_pct": round(avg_win_rate, 2),
-                "total_trades": total_trades,
-                "best_ticker": best["symbol"],
-                "worst_ticker": worst["symbol"],
-            }
-        else:
-            summary = {
-                "portfolio_return_pct": 0,
-                "avg_win_rate_pct": 0,
-                "total_trades": 0,
-                "best_ticker": None,
-                "worst_ticker": None,
-            }
+def _batch_row(sym: str, job: dict, result) -> dict:
+    """One symbol's entry in a batch backtest response."""
+    return {
+        "symbol": sym,
+        "total_return_pct": result.total_return_pct,
+        "win_rate_pct": result.win_rate_pct,
+        "profit_factor": result.profit_factor,
+        "max_drawdown_pct": result.max_drawdown_pct,
+        "trade_count": len(result.trades),
+        "trades": [
+            {"date": t.date, "type": t.type, "price": t.price, "shares": t.shares, "pnl": t.pnl}
+            for t in result.trades
+        ],
+        "equity_curve": result.equity_curve,
+        "data_start": job["data_start"],
+        "data_end": job["data_end"],
+        "from_cache": job["from_cache"],
+    }
 
+
+def _batch_summary(results: list[dict]) -> dict:
+    """Aggregate figures across a batch's per-symbol results."""
+    if not results:
         return {
+            "portfolio_return_pct": 0,
+            "avg_win_rate_pct": 0,
+            "total_trades": 0,
+            "best_ticker": None,
+            "worst_ticker": None,
+        }
+    total_return = sum(r["total_return_pct"] for r in results) / len(results)
+    avg_win_rate = sum(r["win_rate_pct"] for r in results) / len(results)
+    total_trades = sum(r["trade_count"] for r in results)
+    best = max(results, key=lambda r: r["total_return_pct"])
+    worst = min(results, key=lambda r: r["total_return_pct"])
+    return {
+        "portfolio_return_pct": round(total_return, 2),
+        "avg_win_rate_pct": round(avg_win_rate, 2),
+        "total_trades": total_trades,
+        "best_ticker": best["symbol"],
+        "worst_ticker": worst["symbol"],
+    }
+
+
+@app.post("/api/backtest/batch")
+async def batch_backtest(body: BatchBacktestRequest):
+    """Run a backtest across multiple symbols and return aggregated results."""
+    try:
+        strategy, symbols = _resolve_batch(body)
+        start_date, end_date = resolve_date_range(body.start_date, body.end_date, body.period)
+        jobs = await _batch_jobs(body, symbols, start_date, end_date)
+
+        executor = _backtest_executor(strategy)
+        loop = asyncio.get_running_loop()
+        outcomes = await asyncio.gather(*(
+            loop.run_in_executor(executor, run_backtest, strategy, job["df"], body.initial_capital_per_stock)
+            for _, job in jobs if isinstance(job, dict)
+        ), return_exceptions=True)
+        outcomes_iter = iter(outcomes)
+
+        results = []
+        errors = []
+        for sym, job in jobs:
+            if isinstance(job, str):
+                errors.append({"symbol": sym, "error": job})
+                continue
+            result = next(outcomes_iter)
+            if isinstance(result, Exception):
+                errors.append({"symbol": sym, "error": str(result)})
+                continue
+            results.append(_batch_row(sym, job, result))
+
+        return _OrjsonResponse({
             "success": True,
-            "summary": summary,
+            "summary": _batch_summary(results),
             "results": results,
             "errors": errors,
             "date_range": {"start": start_date, "end": end_date},
-        }
+        })
 
+    except ValueError as e:
+        return {"success": False, "error": str(e)}
     except Exception as e:
-        print(f"Batch backtest failed: {e}")
+        log.exception("Batch backtest failed")
         return {"success": False, "error": str(e)}
 
 
+@app.post("/api/backtest/batch/stream")
+async def batch_backtest_stream(body: BatchBacktestRequest):
+    """
+    Same backtests as /api/backtest/batch, streamed as NDJSON so results
+    can be shown as they finish. Lines, each a JSON object with a "type":
+      start   — total symbol count and date_range, sent before any work
+      error   — a symbol that could not be backtested (symbol, error)
+      result  — one symbol's result (data), in completion order
+      summary — the aggregate over all results (data), always last
+    """
+    try:
+        strategy, symbols = _resolve_batch(body)
+    except ValueError as e:
+        return {"success": False, "error": str(e)}
+    start_date, end_date = resolve_date_range(body.start_date, body.end_date, body.period)
+
+    def line(obj: dict) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY) + b"\n"
+
+    async def lines():
+        yield line({"type": "start", "total": len(symbols), "date_range": {"start": start_date, "end": end_date}})
+        results = []
+        try:
+            jobs = await _batch_jobs(body, symbols, start_date, end_date)
+            executor = _backtest_executor(strategy)
+            loop = asyncio.get_running_loop()
+            pending = {}
+            for sym, job in jobs:
+                if isinstance(job, str):
+                    yield line({"type": "error", "symbol": sym, "error": job})
+                    continue
+                future = loop.run_in_executor(executor, run_backtest, strategy, job["df"],
+                                              body.initial_capital_per_stock)
+                pending[future] = (sym, job)
+
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    sym, job = pending.pop(future)
+                    try:
+                        row = _batch_row(sym, job, future.result())
+                    except Exception as e:
+                        yield line({"type": "error", "symbol": sym, "error": str(e)})
+                        continue
+                    results.append(row)
+                    yield line({"type": "result", "data": row})
+        except Exception as e:
+            log.exception("Streamed batch backtest failed")
+            yield line({"type": "error", "symbol": None, "error": str(e)})
+        yield line({"type": "summary", "data": _batch_summary(results)})
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
 @app.post("/api/backtest/{symbol}")
 async def backtest(symbol: str, body: BacktestRequest):
     """Run a backtest for a strategy on a stock's historical data."""
@@ -1698,20 +2139,20 @@ async def backtest(symbol: str, body: BacktestRequest):
         # Get historical data — use date range if provided
         if body.start_date or body.end_date or body.period:
             start_date, end_date = resolve_date_range(body.start_date, body.end_date, body.period)
-            ensure_history(symbol, start_date, end_date)
-            history = stock_db.get_stock_history_range(symbol, start_date, end_date)
+            await asyncio.to_thread(ensure_history, symbol, start_date, end_date)
+            history = get_db().get_stock_history_columns(symbol, start_date, end_date)
         else:
-            history = stock_db.get_stock_history(symbol)
+            history = get_db().get_stock_history_columns(symbol)
 
         if not history:
             return {"success": False, "error": f"No historical data for {symbol}. Load the stock detail first."}
 
         df = pd.DataFrame(history)
 
-        result = run_backtest(strategy, df)
+        result = await asyncio.to_thread(run_backtest, strategy, df)
         result.symbol = symbol
 
-        return {
+        return _OrjsonResponse({
             "success": True,
             "result": {
                 "strategy_name": result.strategy_name,
@@ -1726,10 +2167,10 @@ async def backtest(symbol: str, body: BacktestRequest):
                 ],
                 "equity_curve": result.equity_curve,
             },
-        }
+        })
 
     except Exception as e:
-        print(f"Backtest failed for {symbol}: {e}")
+        log.exception("Backtest failed for %s", symbol)
         return {"success": False, "error": str(e)}
 
 
@@ -1747,11 +2188,10 @@ async def save_strategy(body: SaveStrategyRequest):
 @app.put("/api/strategies/{strategy_name}/params")
 async def save_strategy_params(strategy_name: str, body: StrategyParamsRequest):
     """Persist custom default parameters for a strategy (stored in app_settings)."""
-    import json as _json
     if not strategy_loader.get(strategy_name):
         return {"success": False, "error": f"Strategy '{strategy_name}' not found"}
     key = f"strategy_params_{strategy_name}"
-    stock_db.set_setting(key, _json.dumps(body.params))
+    get_db().set_setting(key, json.dumps(body.params))
     return {"success": True, "strategy_name": strategy_name, "params": body.params}
 
 
@@ -1759,7 +2199,7 @@ async def save_strategy_params(strategy_name: str, body: StrategyParamsRequest):
 async def delete_strategy_params(strategy_name: str):
     """Remove any saved custom parameters for a strategy (revert to defaults)."""
     key = f"strategy_params_{strategy_name}"
-    stock_db.set_setting(key, "")
+    get_db().set_setting(key, "")
     return {"success": True}
 
 
@@ -1768,8 +2208,8 @@ async def delete_strategy_params(strategy_name: str):
 @app.post("/api/binance/validate")
 async def validate_binance():
     """Test Binance API connectivity and validate stored API key credentials."""
-    api_key = stock_db.get_setting("binance_api_key") or ""
-    api_secret = stock_db.get_setting("binance_api_secret") or ""
+    api_key = get_db().get_setting("binance_api_key") or ""
+    api_secret = get_db().get_setting("binance_api_secret") or ""
     result = _validate_binance_keys(api_key, api_secret)
     return result
 
@@ -1804,5 +2244,5 @@ async def list_binance_symbols(q: Optional[str] = None):
 
 
 if __name__ == "__main__":
-    print("Gravion Backend v2.0 Running on http://localhost:8000")
+    log.info("Gravion Backend v2.0 Running on http://localhost:8000")
     uvicorn.run(app, host="0.0.0.0", port=8000)
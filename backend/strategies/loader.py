@@ -1,4 +1,5 @@
 import importlib.util
+import logging
 import os
 import inspect
 
@@ -8,6 +9,8 @@ from .rsi_mean_reversion import RSIMeanReversionStrategy
 from .price_change_momentum import PriceChangeMomentumStrategy
 from .usdt_peg_strategy import USDTPEGStrategy
 
+log = logging.getLogger(__name__)
+
 
 BUILTIN_CLASSES: dict[str, type] = {
     "Golden Cross": GoldenCrossStrategy,
@@ -35,7 +38,7 @@ class StrategyLoader:
         try:
             return cls(**params)
         except Exception as e:
-            print(f"Failed to instantiate {name} with params {params}: {e}")
+            log.warning("Failed to instantiate %s with params %s: %s", name, params, e)
             return None
 
     def register(self, strategy: BaseStrategy) -> None:
@@ -85,7 +88,7 @@ class StrategyLoader:
                             self.register(instance)
                             loaded += 1
             except Exception as e:
-                print(f"Failed to load strategy from {filename}: {e}")
+                log.warning("Failed to load strategy from %s: %s", filename, e)
         return loaded
 
 
@@ -0,0 +1,93 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import StockDatabase  # noqa: E402
+
+
+def _row(date, close, volume=1000):
+    return {"date": date, "open": close, "high": close, "low": close, "close": close, "volume": volume}
+
+
+class SaveManyHistoriesTest(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.db = StockDatabase(os.path.join(self._dir.name, "test.db"))
+
+    def tearDown(self):
+        self.db.close()
+        self._dir.cleanup()
+
+    def test_batch_survives_missing_latest_close(self):
+        # HALT's newest bar has no close (halted/partial day), as yfinance returns
+        batches = {
+            "AAPL": [_row("2024-01-02", 100.0), _row("2024-01-03", 102.0)],
+            "HALT": [_row("2024-01-02", 50.0), _row("2024-01-03", 55.0), _row("2024-01-04", None, None)],
+        }
+        self.assertEqual(self.db.save_many_histories(batches.items()), 5)
+
+        # The whole batch committed, the unpriced bar included
+        self.assertEqual(len(self.db.get_stock_history("AAPL")), 2)
+        self.assertEqual(len(self.db.get_stock_history("HALT")), 3)
+
+        # stock_cache falls back to the newest bar that has a close
+        halt = self.db.get_stocks_by_symbols(["HALT"])[0]
+        self.assertEqual(halt["price"], 55.0)
+        self.assertEqual(halt["change_percent"], 10.0)
+        aapl = self.db.get_stocks_by_symbols(["AAPL"])[0]
+        self.assertEqual(aapl["price"], 102.0)
+        self.assertEqual(self.db.get_db_info()["stock_count"], 2)
+
+    def test_history_without_any_close_skips_cache_refresh(self):
+        self.assertEqual(self.db.save_stock_history("GONE", [_row("2024-01-02", None, None)]), 1)
+        self.assertEqual(len(self.db.get_stock_history("GONE")), 1)
+        self.assertEqual(self.db.get_stocks_by_symbols(["GONE"]), [])
+        self.assertEqual(self.db.get_db_info()["stock_count"], 0)
+
+
+class PageSizeMigrationTest(unittest.TestCase):
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._dir.name, "test.db")
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def _old_file(self, user_version):
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA page_size=4096")
+        conn.execute("CREATE TABLE legacy (x)")
+        conn.execute(f"PRAGMA user_version={user_version}")
+        conn.commit()
+        conn.close()
+
+    def _pragma(self, name):
+        conn = sqlite3.connect(self.path)
+        try:
+            return conn.execute(f"PRAGMA {name}").fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_old_file_is_rebuilt_once(self):
+        self._old_file(user_version=1)
+        with self.assertLogs("db", "INFO") as logs:
+            StockDatabase(self.path).close()
+        self.assertTrue(any("one-time VACUUM" in line for line in logs.output))
+        self.assertEqual(self._pragma("page_size"), 32768)
+        self.assertEqual(self._pragma("user_version"), 2)
+
+    def test_migrated_file_is_not_rebuilt(self):
+        # Version 2 already had its attempt (e.g. the VACUUM was skipped)
+        self._old_file(user_version=2)
+        with self.assertLogs("db", "INFO") as logs:
+            StockDatabase(self.path).close()
+        self.assertFalse(any("one-time VACUUM" in line for line in logs.output))
+        self.assertEqual(self._pragma("page_size"), 4096)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,212 @@
+import itertools
+import math
+import os
+import random
+import sys
+import unittest
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import filters  # noqa: E402
+from filters import (  # noqa: E402
+    _COMPARATORS, _compute_indicators, compile_conditions, evaluate_compiled, evaluate_conditions,
+    get_indicator_values,
+)
+from strategies.indicators import daily_change_pct, rsi, sma  # noqa: E402
+
+
+def _rows(closes, volume=1000):
+    return [
+        {"date": f"2024-{1 + i // 28:02d}-{1 + i % 28:02d}", "open": c, "high": c, "low": c,
+         "close": c, "volume": volume}
+        for i, c in enumerate(closes)
+    ]
+
+
+def _last(series: pd.Series) -> float | None:
+    defined = series.dropna()
+    return float(defined.iloc[-1]) if not defined.empty else None
+
+
+def _reference(history_rows: list[dict]) -> dict | None:
+    """Last values as the pandas indicators give them (the pre-numpy _compute_indicators)."""
+    if len(history_rows) < 2:
+        return None
+    df = pd.DataFrame(history_rows)
+    closes = df["close"].astype(float).dropna()
+    if closes.empty:
+        return None
+    return {
+        "price": float(closes.iloc[-1]),
+        "ma50": _last(sma(closes, 50)),
+        "ma100": _last(sma(closes, 100)),
+        "rsi": _last(rsi(closes, 14)),
+        "change_pct": _last(daily_change_pct(closes)),
+    }
+
+
+class ComputeIndicatorsTest(unittest.TestCase):
+    def assertMatchesReference(self, closes):
+        rows = _rows(closes)
+        expected = _reference(rows)
+        columns = {k: [r[k] for r in rows] for k in ("date", "close", "volume")}
+        for history in (rows, columns):
+            actual = _compute_indicators(history)
+            if expected is None:
+                self.assertIsNone(actual)
+                continue
+            for name, value in expected.items():
+                with self.subTest(indicator=name, input=type(history).__name__):
+                    if value is None:
+                        self.assertIsNone(actual[name])
+                    elif math.isinf(value):
+                        self.assertEqual(actual[name], value)
+                    else:
+                        self.assertAlmostEqual(actual[name], value, places=9)
+
+    def test_random_walk(self):
+        rng = random.Random(3)
+        closes = [100.0]
+        for _ in range(249):
+            closes.append(closes[-1] * (1 + rng.gauss(0, 0.02)))
+        self.assertMatchesReference(closes)
+
+    def test_missing_closes_are_skipped(self):
+        rng = random.Random(5)
+        closes = [100 + rng.uniform(-5, 5) for _ in range(120)]
+        for i in (0, 7, 60, 118):
+            closes[i] = None
+        self.assertMatchesReference(closes)
+        # The newest bar unpriced, and a NaN rather than None
+        self.assertMatchesReference(closes[:-1] + [float("nan")])
+
+    def test_short_histories(self):
+        rng = random.Random(11)
+        closes = [50 + rng.uniform(-2, 2) for _ in range(101)]
+        for n in (1, 2, 3, 13, 14, 15, 49, 50, 51, 99, 100, 101):
+            with self.subTest(bars=n):
+                self.assertMatchesReference(closes[:n])
+
+    def test_flat_series(self):
+        # No losses anywhere: RSI is undefined, change is zero
+        self.assertMatchesReference([10.0] * 120)
+
+    def test_rsi_falls_back_to_last_window_with_a_loss(self):
+        closes = [10.0 + i for i in range(20)] + [25.0] + [26.0 + i for i in range(30)]
+        self.assertMatchesReference(closes)
+
+    def test_zero_previous_close(self):
+        self.assertMatchesReference([1.0, 2.0, 0.0, 3.0])   # x/0 is +inf, kept
+        self.assertMatchesReference([1.0, 2.0, 0.0, 0.0])   # 0/0 is undefined, skipped
+
+    def test_no_close_at_all(self):
+        self.assertIsNone(_compute_indicators(_rows([None, None])))
+        self.assertIsNone(_compute_indicators([]))
+
+
+class IndicatorCacheTest(unittest.TestCase):
+    def setUp(self):
+        filters._indicator_cache.clear()
+        self.rows = _rows([100.0 + (i % 7) for i in range(60)])
+
+    def tearDown(self):
+        filters._indicator_cache.clear()
+
+    def test_same_revision_is_served_from_cache(self):
+        first = get_indicator_values("AAA", self.rows)
+        self.assertIs(get_indicator_values("AAA", list(self.rows)), first)
+        self.assertEqual(len(filters._indicator_cache), 1)
+
+    def test_history_changes_invalidate(self):
+        first = get_indicator_values("AAA", self.rows)
+
+        # Same-day refresh of the latest bar: only the last close differs
+        refreshed = self.rows[:-1] + [dict(self.rows[-1], close=200.0)]
+        values = get_indicator_values("AAA", refreshed)
+        self.assertIsNot(values, first)
+        self.assertEqual(values["price"], 200.0)
+        self.assertEqual(values, _compute_indicators(refreshed))
+
+        # A new bar
+        appended = self.rows + _rows([150.0] * 61)[60:]
+        self.assertEqual(get_indicator_values("AAA", appended)["price"], 150.0)
+
+        # Backfilled older bars: same last date and close, more rows
+        backfilled = _rows([90.0]) + self.rows
+        self.assertEqual(get_indicator_values("AAA", backfilled), _compute_indicators(backfilled))
+        self.assertEqual(len(filters._indicator_cache), 4)
+
+    def test_key_includes_symbol_and_needed(self):
+        full = get_indicator_values("AAA", self.rows)
+        only_rsi = get_indicator_values("AAA", self.rows, frozenset({"rsi"}))
+        self.assertEqual(set(only_rsi), {"rsi"})
+        self.assertIs(get_indicator_values("AAA", self.rows), full)
+        self.assertIsNot(get_indicator_values("BBB", self.rows), full)
+
+    def test_lru_bound(self):
+        for i in range(filters._INDICATOR_CACHE_SIZE + 10):
+            get_indicator_values(f"S{i}", self.rows, frozenset({"price"}))
+        self.assertEqual(len(filters._indicator_cache), filters._INDICATOR_CACHE_SIZE)
+        last = self.rows[-1]
+        self.assertNotIn(("S0", last["date"], 60, last["close"], frozenset({"price"})), filters._indicator_cache)
+        self.assertIn(("S10", last["date"], 60, last["close"], frozenset({"price"})), filters._indicator_cache)
+
+
+def _reference_evaluate(values: dict | None, conditions: list[dict]) -> bool:
+    """The per-condition evaluation compile_conditions replaced."""
+    if not conditions:
+        return True
+    if values is None:
+        return False
+    for cond in conditions:
+        left = values.get(cond.get("indicator"))
+        if left is None:
+            return False
+        right_raw = cond.get("value")
+        right = values.get(right_raw) if isinstance(right_raw, str) else right_raw
+        if right is None:
+            return False
+        fn = _COMPARATORS.get(cond.get("comparator", ">"))
+        if fn is None or not fn(left, right):
+            return False
+    return True
+
+
+class CompiledConditionsTest(unittest.TestCase):
+    VALUES = {"price": 101.5, "ma50": 100.0, "ma100": 101.5, "rsi": None, "change_pct": -1.25, "volume": 1e6}
+
+    def test_every_comparator_matches_reference(self):
+        comparators = list(_COMPARATORS) + ["!=", None]
+        rights = [100.0, 101.5, 102, -1.25, "ma50", "ma100", "price", "rsi", "unknown"]
+        lefts = ["price", "ma50", "change_pct", "rsi", "unknown"]
+        for left, comp, right in itertools.product(lefts, comparators, rights):
+            cond = {"indicator": left, "value": right}
+            if comp is not None:
+                cond["comparator"] = comp
+            with self.subTest(cond=cond):
+                expected = _reference_evaluate(self.VALUES, [cond])
+                self.assertEqual(evaluate_compiled(self.VALUES, compile_conditions([cond])), expected)
+                self.assertEqual(evaluate_conditions(self.VALUES, [cond]), expected)
+
+    def test_conditions_combine_with_and(self):
+        rng = random.Random(17)
+        comparators = list(_COMPARATORS)
+        for _ in range(200):
+            conditions = [
+                {"indicator": rng.choice(["price", "ma50", "ma100"]), "comparator": rng.choice(comparators),
+                 "value": rng.choice([100.0, 101.5, "ma50", "ma100", "price"])}
+                for _ in range(rng.randint(1, 3))
+            ]
+            with self.subTest(conditions=conditions):
+                self.assertEqual(evaluate_compiled(self.VALUES, compile_conditions(conditions)),
+                                 _reference_evaluate(self.VALUES, conditions))
+
+    def test_empty_conditions_and_missing_values(self):
+        self.assertTrue(evaluate_compiled(None, compile_conditions([])))
+        self.assertFalse(evaluate_compiled(None, compile_conditions([{"indicator": "price", "value": 1}])))
+
+
+if __name__ == "__main__":
+    unittest.main()
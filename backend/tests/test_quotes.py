@@ -0,0 +1,121 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import _download_field, _last_valid_rows, _latest_quotes  # noqa: E402
+
+NAN = float("nan")
+FIELDS = ("Open", "High", "Low", "Close", "Volume")
+DATES = pd.DatetimeIndex(["2024-01-02", "2024-01-03", "2024-01-04"])
+
+
+def _hist(closes, **fields) -> pd.DataFrame:
+    """One symbol's OHLCV frame; fields not given follow the closes."""
+    return pd.DataFrame({f: fields.get(f.lower(), closes) for f in FIELDS}, index=DATES[:len(closes)])
+
+
+def _group_by_ticker(hists: dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """A multi-symbol yf.download(..., group_by="ticker") frame: (ticker, field) columns."""
+    return pd.concat(hists, axis=1)
+
+
+def _reference_quote(hist: pd.DataFrame) -> dict | None:
+    """The per-symbol dropna().iloc[-1] reads _latest_quotes replaced."""
+    close_series = hist["Close"].dropna()
+    if hist.empty or close_series.empty:
+        return None
+    quote = {
+        field.lower(): (float(hist[field].dropna().iloc[-1]) if not hist[field].dropna().empty else None)
+        for field in FIELDS
+    }
+    change_pct = 0.0
+    if len(close_series) >= 2:
+        prev_close = float(close_series.iloc[-2])
+        if prev_close != 0:
+            change_pct = (quote["close"] - prev_close) / prev_close * 100
+    quote["change_pct"] = change_pct
+    return quote
+
+
+# Symbol -> history, covering the edge cases of a 2-day quote download
+HISTS = {
+    "PLAIN": _hist([100.0, 101.0, 103.0]),
+    "TRAILING": _hist([50.0, 55.0, NAN]),                       # newest bar not priced yet
+    "SINGLE": _hist([NAN, NAN, 20.0]),                          # one valid close
+    "ZEROPREV": _hist([5.0, 0.0, 2.0]),                         # previous close is zero
+    "GAP": _hist([10.0, NAN, 12.0], volume=[1e6, 2e6, NAN]),   # volume has its own last value
+    "NOOPEN": _hist([7.0, 8.0, 9.0], open=[NAN, NAN, NAN]),
+    "EMPTY": _hist([NAN, NAN, NAN]),
+}
+
+
+class LastValidRowsTest(unittest.TestCase):
+    def test_rows_per_column(self):
+        arr = np.array([
+            [1.0, NAN, NAN, 4.0],
+            [2.0, NAN, 3.0, NAN],
+            [NAN, NAN, NAN, NAN],
+        ])
+        last_i, prev_i = _last_valid_rows(arr)
+        self.assertEqual(last_i.tolist(), [1, -1, 1, 0])
+        self.assertEqual(prev_i.tolist(), [0, -1, -1, -1])
+
+
+class DownloadFieldTest(unittest.TestCase):
+    def test_multi_symbol_frame(self):
+        data = _group_by_ticker({"AAA": _hist([1.0, 2.0]), "BBB": _hist([3.0, NAN])})
+        closes = _download_field(data, "Close", ["AAA", "BBB"])
+        self.assertEqual(list(closes.columns), ["AAA", "BBB"])
+        self.assertEqual(closes["AAA"].tolist(), [1.0, 2.0])
+
+    def test_single_symbol_frame_shapes(self):
+        hist = _hist([1.0, 2.0])
+        flat = _download_field(hist, "Close", ["AAA"])
+        # Newer yfinance keeps a (field, ticker) column index for one symbol
+        nested = _download_field(pd.concat({"AAA": hist}, axis=1).swaplevel(axis=1), "Close", ["AAA"])
+        for closes in (flat, nested):
+            self.assertEqual(list(closes.columns), ["AAA"])
+            self.assertEqual(closes["AAA"].tolist(), [1.0, 2.0])
+
+
+class LatestQuotesTest(unittest.TestCase):
+    def assertQuotesMatch(self, quotes, hists):
+        for symbol, hist in hists.items():
+            with self.subTest(symbol=symbol):
+                expected = _reference_quote(hist)
+                if expected is None:
+                    self.assertNotIn(symbol, quotes)
+                    continue
+                self.assertEqual(set(quotes[symbol]), set(expected))
+                for key, value in expected.items():
+                    if value is None:
+                        self.assertIsNone(quotes[symbol][key], key)
+                    else:
+                        self.assertAlmostEqual(quotes[symbol][key], value, places=9, msg=key)
+
+    def test_multi_symbol_matches_per_symbol_reads(self):
+        symbols = list(HISTS)
+        quotes = _latest_quotes(_group_by_ticker(HISTS), symbols)
+        self.assertEqual(set(quotes), set(symbols) - {"EMPTY"})
+        self.assertQuotesMatch(quotes, HISTS)
+        self.assertEqual(quotes["TRAILING"]["close"], 55.0)
+        self.assertEqual(quotes["SINGLE"]["change_pct"], 0.0)
+        self.assertEqual(quotes["ZEROPREV"]["change_pct"], 0.0)
+        self.assertEqual(quotes["GAP"]["volume"], 2e6)
+
+    def test_single_symbol(self):
+        for symbol, hist in HISTS.items():
+            for data in (hist, pd.concat({symbol: hist}, axis=1).swaplevel(axis=1)):
+                self.assertQuotesMatch(_latest_quotes(data, [symbol]), {symbol: hist})
+
+    def test_empty_download(self):
+        self.assertEqual(_latest_quotes(pd.DataFrame(columns=list(FIELDS)), ["AAA"]), {})
+
+
+if __name__ == "__main__":
+    unittest.main()